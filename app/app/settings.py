@@ -106,15 +106,39 @@ WSGI_APPLICATION = 'app.wsgi.application'
 DATABASES = {
     'default': {
         # django.db.backends.postgresql is defined inside Django documentation
-        'ENGINE': 'django.db.backends.postgresql', # name of the engine we want Django to use
+        # (DB_ENGINE=django.db.backends.sqlite3 with DB_NAME=<file> runs the
+        # tests without Postgres, search then falls back to substring matching)
+        'ENGINE': os.environ.get('DB_ENGINE', 'django.db.backends.postgresql'),
         # DB_ match names in app environment in docker-compose.yml file
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        'PORT': os.environ.get('DB_PORT', ''),
+        # keep connections open between requests (seconds, 0 to close
+        # after every request) instead of reconnecting each time
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        # check a persistent connection still works before reusing it
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('DB_CONN_HEALTH_CHECKS', 1))
+        ),
     }
 }
 
+# set DB_PGBOUNCER=1 when DB_HOST/DB_PORT point at pgbouncer
+# (transaction pooling doesn't support server-side cursors)
+DB_PGBOUNCER = bool(int(os.environ.get('DB_PGBOUNCER', 0)))
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = DB_PGBOUNCER
+
+# every uwsgi thread holds one persistent connection, so the app opens up
+# to UWSGI_WORKERS * UWSGI_THREADS connections (same values as run.sh);
+# DB_RESERVED_CONNECTIONS are left for migrations, shells and admin tools
+UWSGI_WORKERS = int(os.environ.get('UWSGI_WORKERS', 4))
+UWSGI_THREADS = int(os.environ.get('UWSGI_THREADS', 4))
+DB_RESERVED_CONNECTIONS = int(os.environ.get('DB_RESERVED_CONNECTIONS', 5))
+# run_jobs processes (worker service replicas), one connection each
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
@@ -134,6 +158,44 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# hasher of new passwords, 'pbkdf2' or 'argon2' (memory-hard); hashes
+# made otherwise are upgraded when their user logs in (core.hashers)
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'core.hashers.PBKDF2PasswordHasher',
+    'argon2': 'core.hashers.Argon2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS[PASSWORD_HASHER],
+    *(path for name, path in _PASSWORD_HASHERS.items()
+      if name != PASSWORD_HASHER),
+    # verify passwords hashed by Django's other default hashers
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# work factors (defaults: Django's), changing them rehashes at login
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000)
+)
+PASSWORD_ARGON2_TIME_COST = int(
+    os.environ.get('PASSWORD_ARGON2_TIME_COST', 2)
+)
+# KiB
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get('PASSWORD_ARGON2_PARALLELISM', 8)
+)
+# logins/signups hashing at once per process (the other uwsgi threads
+# stay free for the rest of the API, so keep it below UWSGI_THREADS,
+# see core.W001), and seconds a request waits for its turn before a 503
+PASSWORD_HASHING_THREADS = int(os.environ.get('PASSWORD_HASHING_THREADS', 1))
+PASSWORD_HASHING_TIMEOUT = float(
+    os.environ.get('PASSWORD_HASHING_TIMEOUT', 5)
+)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.0/topics/i18n/
@@ -153,11 +215,35 @@ USE_TZ = True
 # and the locations on the filesystem to store those files.
 
 STATIC_URL = '/static/static/'
-MEDIA_URL = '/static/media/'
+# media isn't public: core.views.media checks the requester owns the file
+MEDIA_URL = '/api/media/'
 
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# recipe images and profile pictures are named by their SHA-256, so the
+# same file is stored once (core.storage); gc_media deletes files nothing
+# references anymore, once they're older than MEDIA_GC_GRACE seconds
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'images': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+MEDIA_GC_GRACE = int(os.environ.get('MEDIA_GC_GRACE', 3600))
+
+# set to the internal nginx location serving MEDIA_ROOT (/protected-media/)
+# to hand media transfers to nginx (X-Accel-Redirect); when empty (dev
+# server) the media view streams files itself
+MEDIA_ACCEL_REDIRECT = os.environ.get('MEDIA_ACCEL_REDIRECT', '')
+# seconds media URLs returned by the APIs stay valid (at least)
+MEDIA_URL_TTL = int(os.environ.get('MEDIA_URL_TTL', 24 * 3600))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.0/ref/settings/#default-auto-field
 
@@ -168,11 +254,82 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # access tokens are trusted without loading the user (views
+    # needing the user's row set JWTAuthentication)
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.StatelessJWTAuthentication',
     ),
+    # JSON encoded/decoded with orjson, same documents as DRF's classes
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
+}
+
+# cache backend, local memory by default (tests, dev server);
+# multi-worker deployments need a shared one, e.g. CACHE_BACKEND=
+# django.core.cache.backends.filebased.FileBasedCache with a directory
+# or django.core.cache.backends.memcached.PyMemcacheCache with a socket
+# as CACHE_LOCATION
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
 }
 
+# seconds a user's recipe/tag/ingredient list responses stay cached
+# (writes invalidate them right away, this only bounds memory use)
+RECIPE_LIST_CACHE_TIMEOUT = int(
+    os.environ.get('RECIPE_LIST_CACHE_TIMEOUT', 300)
+)
+
+# default and maximum (?page_size=) number of items per page on list APIs
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 200))
+
+# maximum number of recipes accepted by POST /api/recipe/recipes/bulk/
+# (keeps a single request from holding a transaction open too long)
+RECIPE_BULK_MAX_BATCH_SIZE = int(
+    os.environ.get('RECIPE_BULK_MAX_BATCH_SIZE', 500)
+)
+
+# number of names returned by the tags/ingredients suggest APIs and
+# seconds clients may reuse a suggestion response without asking again
+SUGGEST_LIMIT = int(os.environ.get('SUGGEST_LIMIT', 10))
+SUGGEST_MAX_AGE = int(os.environ.get('SUGGEST_MAX_AGE', 30))
+
+# default and maximum (?limit=) number of changes per GET /api/recipe/sync/
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_MAX_PAGE_SIZE = int(os.environ.get('SYNC_MAX_PAGE_SIZE', 5000))
+
+# background jobs (python manage.py run_jobs): attempts before giving up,
+# first retry delay (doubled on every retry), seconds after which a job
+# whose worker died is run again, idle poll interval and how long
+# finished jobs are kept (seconds)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 10))
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 1))
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 7 * 24 * 3600))
+
+# chunked uploads (api/uploads/): largest file and chunk accepted (bytes)
+# and seconds an unfinished upload is kept before its file is deleted
+# (UPLOAD_CHUNK_MAX_SIZE must stay below client_max_body_size in nginx)
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 50 * 1024 * 1024))
+UPLOAD_CHUNK_MAX_SIZE = int(
+    os.environ.get('UPLOAD_CHUNK_MAX_SIZE', 8 * 1024 * 1024)
+)
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 3600))
+
 
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=1),
@@ -207,13 +364,29 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "user.serializers.CachedTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 
+# seconds deactivated (or deleted) users' access tokens may still be
+# accepted by views authenticating with
+# core.authentication.StatelessJWTAuthentication
+JWT_DEACTIVATED_USERS_TTL = int(
+    os.environ.get('JWT_DEACTIVATED_USERS_TTL', 60)
+)
+
+# seconds a refresh token found not blacklisted is cached as such
+# (see core.tokens.CachedRefreshToken)
+JWT_BLACKLIST_CACHE_TTL = int(os.environ.get('JWT_BLACKLIST_CACHE_TTL', 30))
+# set JWT_PRUNE_TOKENS=0 to not delete the blacklist rows of expired
+# tokens in run_jobs (the prune_tokens command still does)
+JWT_PRUNE_TOKENS = bool(int(os.environ.get('JWT_PRUNE_TOKENS', 1)))
+# expired tokens deleted per query
+JWT_PRUNE_BATCH_SIZE = int(os.environ.get('JWT_PRUNE_BATCH_SIZE', 1000))
+
 # enable to make image uploads work through the browsable image interface
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
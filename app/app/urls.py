@@ -22,9 +22,6 @@ from django.contrib import admin
 # include: helper function that allows to include urls from a different app
 from django.urls import path, include
 
-from django.conf.urls.static import static  # import static url
-from django.conf import settings  # to retrieve settings
-
 from core import views as core_views
 
 urlpatterns = [
@@ -33,6 +30,9 @@ urlpatterns = [
 
     path('api/health-check/', core_views.health_check, name='health-check'),
 
+    # recipe images and profile pictures, for their owner only
+    path('api/media/<path:name>', core_views.media, name='media'),
+
     # api/schema/ url generates schema for our API and uses SpectacularAPIView
     # Schema is a yaml file that describes the API
     # SpectacularAPIView: generates the schema file needed for our project
@@ -49,12 +49,6 @@ urlpatterns = [
     path('api/user/', include('user.urls')),
     # include all URLs defined inside /recipes/urls.py
     path('api/recipe/', include('recipe.urls')),
+    # resumable chunked uploads: api/uploads/
+    path('api/', include('core.urls')),
 ]
-
-# mimic behavior expected from Django dev server
-# allow it to serve media files from dev server (not happening by default)
-if settings.DEBUG:  # if debug mode (dev server o local machine)
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
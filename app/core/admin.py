@@ -12,6 +12,7 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _
 from core import models
 from core.models import UserProfile
+from recipe.search import update_search_vector
 
 class ProfileInline(admin.StackedInline):
     model = UserProfile
@@ -69,11 +70,22 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RecipeAdmin(admin.ModelAdmin):
+    """Keep search_vector current when recipes are edited in the admin."""
+
+    def save_related(self, request, form, formsets, change):
+        # tags/ingredients are saved after the recipe itself
+        super().save_related(request, form, formsets, change)
+        update_search_vector(
+            models.Recipe.objects.filter(id=form.instance.id),
+        )
+
+
 admin.site.register(models.UserProfile)
 # register User model and assign custom UserAdmin class
 admin.site.register(models.User, UserAdmin)
-# register Recipe model (no custom Django admin class)
-admin.site.register(models.Recipe)
+# register Recipe model
+admin.site.register(models.Recipe, RecipeAdmin)
 # register Tag model so that it's manageble through Django Admin Interface
 admin.site.register(models.Tag)
 # register Ingredient model so that it's manageble through DAI
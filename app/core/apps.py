@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # register system checks
+        from core import checks  # noqa: F401
+        # register the signal receivers of the JWT authentication
+        from core import authentication  # noqa: F401
+        # register the job handlers of all apps (<app>/jobs.py)
+        from core import jobs
+        jobs.autodiscover()
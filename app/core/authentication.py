@@ -0,0 +1,151 @@
+"""
+JWT authentication that doesn't load the user (or loads their profile).
+
+JWTAuthentication reads the user's row on every request. Most views
+only need the user's id (to filter by or save as owner), which the
+validated access token already carries: StatelessJWTAuthentication
+sets request.user to a User instance with only its id loaded. Its other
+fields are loaded by Django the first time they're read.
+
+Deactivated and deleted users are still refused: their ids are cached
+by each process for JWT_DEACTIVATED_USERS_TTL seconds, so deactivating
+or deleting a user takes up to that long to lock them out. Deleted
+users' ids are kept in the cache (shared by the processes when it's
+configured so) until their last access tokens expire; with per-process
+caches, only the process that deleted the user knows about them.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+# {user id: timestamp their last access token expires}
+DELETED_USERS_KEY = 'jwt-deleted-users'
+
+_deactivated = {'ids': frozenset(), 'expires': 0.0}
+_lock = threading.Lock()
+
+
+def _deleted_users(now):
+    return {
+        user_id: expires
+        for user_id, expires in cache.get(DELETED_USERS_KEY, {}).items()
+        if expires > now
+    }
+
+
+def deactivated_user_ids():
+    """Return the (cached) ids of the users who aren't active or deleted."""
+    if time.monotonic() >= _deactivated['expires']:
+        with _lock:
+            if time.monotonic() >= _deactivated['expires']:
+                ids = get_user_model().objects.filter(
+                    is_active=False,
+                ).values_list(api_settings.USER_ID_FIELD, flat=True)
+                deleted = _deleted_users(timezone.now().timestamp())
+                _deactivated['ids'] = frozenset(ids).union(deleted)
+                _deactivated['expires'] = (
+                    time.monotonic() + settings.JWT_DEACTIVATED_USERS_TTL
+                )
+    return _deactivated['ids']
+
+
+def clear_deactivated_user_ids():
+    """Reload the deactivated users on the next request of this process."""
+    _deactivated['expires'] = 0.0
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, **kwargs):
+    # at least the process (de)activating the user notices right away
+    if not instance.is_active or instance.pk in _deactivated['ids']:
+        clear_deactivated_user_ids()
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_deleted(sender, instance, **kwargs):
+    # their tokens stay valid until they expire, writes made with them
+    # would fail on the missing user
+    now = timezone.now().timestamp()
+    lifetime = api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+    deleted = _deleted_users(now)
+    deleted[instance.pk] = now + lifetime
+    cache.set(DELETED_USERS_KEY, deleted, lifetime)
+    clear_deactivated_user_ids()
+
+
+def token_user(user_id):
+    """Return a User with only its id loaded (the rest is deferred).
+
+    Expects USER_ID_FIELD to be the primary key, as by default.
+    """
+    User = get_user_model()
+    return User.from_db(
+        DEFAULT_DB_ALIAS, [User._meta.pk.attname], [user_id],
+    )
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication trusting the user id of valid access tokens."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'),
+            )
+        # claims may be strings (simplejwt >= 5.5), the cached ids aren't
+        try:
+            user_id = get_user_model()._meta.pk.to_python(user_id)
+        except ValidationError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'),
+            )
+        if user_id in deactivated_user_ids():
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive',
+            )
+        return token_user(user_id)
+
+
+class ProfileJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication loading the user's profile in the same query.
+
+    For the views rendering the user's row and profile anyway.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'),
+            )
+        try:
+            user = self.user_model.objects.select_related('profile').get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(
+                _('User not found'), code='user_not_found',
+            )
+        if not user.is_active:
+            raise AuthenticationFailed(
+                _('User is inactive'), code='user_inactive',
+            )
+        return user
@@ -0,0 +1,67 @@
+"""
+System checks for the app.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+
+
+def server_connection_limit(connection):
+    """Return how many connections non-superusers may open on the server."""
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW max_connections')
+        max_connections = int(cursor.fetchone()[0])
+        cursor.execute('SHOW superuser_reserved_connections')
+        reserved = int(cursor.fetchone()[0])
+    return max_connections - reserved
+
+
+# database checks run by 'migrate' (scripts/run.sh), before uwsgi starts
+@register(Tags.database)
+def check_connection_budget(app_configs, databases=None, **kwargs):
+    """Refuse worker/thread counts the database can't serve."""
+    if not databases or 'default' not in databases:
+        return []
+
+    connection = connections['default']
+    # pgbouncer multiplexes client connections onto its own pool
+    if settings.DB_PGBOUNCER or connection.vendor != 'postgresql':
+        return []
+
+    needed = (
+        settings.UWSGI_WORKERS * settings.UWSGI_THREADS
+        + settings.JOB_WORKERS
+        + settings.DB_RESERVED_CONNECTIONS
+    )
+    limit = server_connection_limit(connection)
+    if needed > limit:
+        return [
+            Error(
+                f'{settings.UWSGI_WORKERS} workers x '
+                f'{settings.UWSGI_THREADS} threads + '
+                f'{settings.JOB_WORKERS} job workers + '
+                f'{settings.DB_RESERVED_CONNECTIONS} reserved connections '
+                f'exceed the {limit} connections allowed by the database.',
+                hint='Lower UWSGI_WORKERS/UWSGI_THREADS/JOB_WORKERS, raise '
+                     'the server max_connections or set DB_PGBOUNCER=1 and '
+                     'connect through pgbouncer.',
+                id='core.E001',
+            )
+        ]
+    return []
+
+
+@register()
+def check_hashing_threads(app_configs, **kwargs):
+    """Warn when password hashing can take every uwsgi thread."""
+    if settings.PASSWORD_HASHING_THREADS < settings.UWSGI_THREADS:
+        return []
+    return [
+        Warning(
+            f'{settings.PASSWORD_HASHING_THREADS} password hashing slots '
+            f'for {settings.UWSGI_THREADS} uwsgi threads per process: a '
+            f'burst of logins can hold every thread.',
+            hint='Run more UWSGI_THREADS than PASSWORD_HASHING_THREADS.',
+            id='core.W001',
+        )
+    ]
@@ -0,0 +1,86 @@
+"""
+Conditional GET (ETag / If-None-Match, Last-Modified) for API views.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """Return a strong ETag built from the given values."""
+    digest = hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def set_validators(response, etag, last_modified):
+    """Add the ETag/Last-Modified headers to a response."""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    # clients may keep the response but must revalidate it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def not_modified_response(request, etag, last_modified):
+    """Return a 304 response if the client's copy is current, else None."""
+    response = get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp()),
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
+
+
+class ConditionalGetMixin:
+    """Answer matching conditional GETs with 304 before serializing.
+
+    Detail validators come from the object's updated_at, list validators
+    from a single aggregate query (max updated_at and row count).
+    """
+
+    def get_object_validators(self, instance):
+        """Return (etag, last_modified) of a detail response."""
+        return (
+            make_etag(self.request.get_full_path(), instance.pk,
+                      instance.updated_at.isoformat()),
+            instance.updated_at,
+        )
+
+    def get_list_validators(self, queryset):
+        """Return (etag, last_modified) of a list response."""
+        stats = queryset.order_by().aggregate(
+            last_modified=Max('updated_at'), count=Count('pk'),
+        )
+        last_modified = stats['last_modified']
+        return (
+            make_etag(self.request.get_full_path(), self.request.user.pk,
+                      stats['count'],
+                      last_modified and last_modified.isoformat()),
+            last_modified,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(instance)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(instance)
+        return set_validators(Response(serializer.data), etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        etag, last_modified = self.get_list_validators(queryset)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().list(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
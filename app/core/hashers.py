@@ -0,0 +1,83 @@
+"""
+Password hashers with a work factor set from the environment.
+
+PASSWORD_HASHER picks the hasher of new passwords: 'pbkdf2' (default)
+or 'argon2' (memory-hard, needs argon2-cffi). Hashes made by another
+hasher, or with other parameters, are rehashed by Django the next time
+their user logs in (see must_update()).
+
+Hashing takes most of a login's or signup's CPU time: hashing_slot()
+lets a process run at most PASSWORD_HASHING_THREADS of them at once, so
+a burst of logins leaves the other threads free for the rest of the API.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with PASSWORD_PBKDF2_ITERATIONS iterations."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Argon2id with the PASSWORD_ARGON2_* costs."""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class HashingBusy(APIException):
+    """All password hashing slots of the process stayed busy."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('Too many logins at the moment, retry shortly.')
+    default_code = 'hashing_busy'
+    # seconds, sent as Retry-After
+    wait = 1
+
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _get_slots():
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(
+                settings.PASSWORD_HASHING_THREADS,
+            )
+    return _slots
+
+
+@contextmanager
+def hashing_slot():
+    """Wait up to PASSWORD_HASHING_TIMEOUT seconds for a hashing slot.
+
+    Raises HashingBusy (503) if none frees up in time.
+    """
+    slots = _get_slots()
+    if not slots.acquire(timeout=settings.PASSWORD_HASHING_TIMEOUT):
+        raise HashingBusy()
+    try:
+        yield
+    finally:
+        slots.release()
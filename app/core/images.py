@@ -0,0 +1,298 @@
+"""
+Image processing of uploaded pictures.
+
+An upload is decoded once, rotated upright from its EXIF orientation and
+re-encoded without metadata into a few sizes, in WebP and JPEG.
+"""
+import os
+import uuid
+from io import BytesIO
+
+from urllib.parse import urlencode
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from core import jobs, models
+from core.storage import image_storage, media_token
+
+# variant name -> longest side in pixels, largest first
+# (each size is resized from the previous one)
+VARIANTS = {
+    'full': 1600,
+    'card': 600,
+    'thumb': 200,
+}
+
+# format (file extension) -> Pillow format and save options
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+# storage directory of uploads waiting to be processed
+UPLOAD_DIR = 'uploads/tmp'
+
+
+class ImageProcessingError(ValueError):
+    """The uploaded file isn't an image Pillow can decode."""
+
+
+def _open(file):
+    """Decode file into an upright RGB(A) image."""
+    file.seek(0)
+    try:
+        image = Image.open(file)
+        # JPEGs can be decoded directly at a reduced scale,
+        # much faster than decoding full size and resizing
+        size = VARIANTS['full']
+        image.draft('RGB', (size, size))
+        image.load()
+    except (OSError, SyntaxError, ValueError,
+            Image.DecompressionBombError) as exc:
+        raise ImageProcessingError(str(exc)) from exc
+
+    # rotates the pixels and drops the orientation tag
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert(
+            'RGBA' if 'transparency' in image.info or 'A' in image.mode
+            else 'RGB'
+        )
+    return image
+
+
+def _encode(image, fmt):
+    """Encode image without EXIF/XMP metadata (ICC profile is kept)."""
+    pil_format, options = FORMATS[fmt]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+
+    buffer = BytesIO()
+    image.save(
+        buffer, pil_format,
+        icc_profile=image.info.get('icc_profile'),
+        **options,
+    )
+    return buffer.getvalue()
+
+
+def process_image(file, path, storage=image_storage):
+    """Save resized variants of the image in file.
+
+    path: file path without extension, e.g. 'uploads/recipe/<uuid>'.
+    Returns {variant: {'width', 'height', <format>: <storage name>}}.
+    Raises ImageProcessingError when file can't be decoded.
+    """
+    image = _open(file)
+    variants = {}
+
+    for variant, size in VARIANTS.items():
+        # never upscales
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        variants[variant] = {'width': image.width, 'height': image.height}
+        for fmt in FORMATS:
+            # named by content: an identical file is stored once
+            variants[variant][fmt] = storage.save(
+                f'{path}-{variant}.{fmt}',
+                ContentFile(_encode(image, fmt)),
+            )
+
+    return variants
+
+
+def variant_files(variants):
+    """Return the storage names of all files of variants."""
+    return {
+        files[fmt]
+        for files in (variants or {}).values()
+        for fmt in FORMATS
+        if fmt in files
+    }
+
+
+def delete_variants(variants, storage=image_storage):
+    """Delete the files of variants from the storage."""
+    for name in variant_files(variants):
+        storage.delete(name)
+
+
+def media_url(name, request=None, storage=image_storage):
+    """Return the URL of an image file.
+
+    For an authenticated request, the URL carries a token letting the
+    user's browser fetch it (see core.views.media).
+    """
+    url = storage.url(name)
+    if request is None:
+        return url
+    user = request.user
+    if user.is_authenticated:
+        url += '?' + urlencode({'token': media_token(name, user.id)})
+    return request.build_absolute_uri(url)
+
+
+def variant_urls(variants, request=None, storage=image_storage):
+    """Return variants with file URLs instead of storage names."""
+    return {
+        variant: {
+            key: (
+                media_url(value, request, storage) if key in FORMATS
+                else value
+            )
+            for key, value in files.items()
+        }
+        for variant, files in (variants or {}).items()
+    }
+
+
+def srcsets(variants, request=None, storage=image_storage):
+    """Return {format: 'url 200w, url 600w, ...'} for <img srcset>."""
+    by_width = sorted((variants or {}).values(), key=lambda v: v['width'])
+    return {
+        fmt: ', '.join(
+            f'{media_url(files[fmt], request, storage)} {files["width"]}w'
+            for files in by_width if fmt in files
+        )
+        for fmt in FORMATS
+        if by_width
+    }
+
+
+def queue_upload(instance, field, file, kind, key=None):
+    """Store an uploaded image and queue the job processing it.
+
+    instance.<field> keeps its current image until the job is done;
+    <field>_status says 'pending' meanwhile. key: idempotency key of
+    the upload (e.g. from the Idempotency-Key header), a retried upload
+    with the same key isn't stored or queued twice.
+    Returns the job.
+    """
+    if key is not None:
+        job = models.Job.objects.filter(idempotency_key=key).first()
+        if job is not None:
+            return job
+
+    ext = os.path.splitext(file.name)[1].lower()
+    upload = default_storage.save(f'{UPLOAD_DIR}/{uuid.uuid4()}{ext}', file)
+    return queue_stored_upload(instance, field, upload, kind, key)
+
+
+def queue_stored_upload(instance, field, upload, kind, key=None):
+    """Queue the processing of an image already saved as upload.
+
+    upload: storage name of the file, which the job deletes once done.
+    Returns the job.
+
+    The job is queued first and <field>_pending set in the same
+    transaction, so the worker can't run it before. When a retry with
+    the same key queued concurrently won, its job and file are kept
+    (the instance was set pending by that request) and upload deleted.
+    """
+    with transaction.atomic():
+        job = jobs.enqueue(kind, {
+            'model': instance._meta.label_lower,
+            'pk': instance.pk,
+            'field': field,
+            'upload': upload,
+        }, key=key)
+        if job.payload['upload'] == upload:
+            setattr(instance, f'{field}_pending', upload)
+            setattr(instance, f'{field}_status', models.IMAGE_PENDING)
+            instance.save(update_fields=[
+                f'{field}_pending', f'{field}_status', 'updated_at',
+            ])
+    if job.payload['upload'] != upload:
+        _delete_files([upload])
+        instance.refresh_from_db(
+            fields=[f'{field}_pending', f'{field}_status'],
+        )
+    return job
+
+
+def _delete_files(names, storage=default_storage):
+    for name in names:
+        if name:
+            storage.delete(name)
+
+
+def process_upload(payload, storage=image_storage):
+    """Job handler turning a queued upload into the instance's variants.
+
+    Returns the updated instance, or None when there was nothing to do
+    (instance deleted, or a newer upload replaced this one).
+    Undecodable images set the status to 'failed' without retrying.
+    Files of the previous image are released (see models.MediaBlob),
+    gc_media deletes them once nothing else uses them.
+    """
+    model = apps.get_model(payload['model'])
+    field, upload = payload['field'], payload['upload']
+    pending = f'{field}_pending'
+    instance = model.objects.filter(
+        pk=payload['pk'], **{pending: upload},
+    ).first()
+    if instance is None:
+        _delete_files([upload])
+        return None
+
+    try:
+        with default_storage.open(upload) as file:
+            variants = process_image(
+                file, _variant_path(instance), storage,
+            )
+    except ImageProcessingError:
+        upload_failed(payload)
+        return None
+
+    with transaction.atomic():
+        instance = model.objects.select_for_update().filter(
+            pk=payload['pk'], **{pending: upload},
+        ).first()
+        if instance is None:
+            # replaced while processing; the variants may be shared
+            # with other images, left unreferenced for gc_media
+            _delete_files([upload])
+            return None
+
+        old_files = models.media_files(instance, field)
+        getattr(instance, field).name = variants['full']['jpeg']
+        setattr(instance, f'{field}_variants', variants)
+        setattr(instance, f'{field}_status', models.IMAGE_READY)
+        setattr(instance, pending, '')
+        instance.save(update_fields=[
+            field, f'{field}_variants', f'{field}_status', pending,
+            'updated_at',
+        ])
+        # acquire first: a re-upload of the same image keeps its files
+        models.MediaBlob.objects.acquire(models.media_files(instance, field))
+        models.MediaBlob.objects.release(old_files)
+        transaction.on_commit(lambda: _delete_files([upload]))
+
+    return instance
+
+
+def upload_failed(payload):
+    """Mark a queued upload as failed (if it's still the pending one)."""
+    model = apps.get_model(payload['model'])
+    field, upload = payload['field'], payload['upload']
+    instance = model.objects.filter(
+        pk=payload['pk'], **{f'{field}_pending': upload},
+    ).first()
+    if instance is not None:
+        setattr(instance, f'{field}_status', models.IMAGE_FAILED)
+        setattr(instance, f'{field}_pending', '')
+        instance.save(update_fields=[
+            f'{field}_status', f'{field}_pending', 'updated_at',
+        ])
+    _delete_files([upload])
+
+
+def _variant_path(instance):
+    """Return the path (without extension) for new variant files."""
+    return os.path.splitext(models.image_file_path(instance, 'x.jpg'))[0]
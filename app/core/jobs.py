@@ -0,0 +1,156 @@
+"""
+Database backed job queue.
+
+Jobs are rows of core.Job, run by `python manage.py run_jobs` workers.
+Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, so several of
+them can run side by side without an external broker.
+
+Handlers are registered in <app>/jobs.py modules:
+
+    @jobs.register('kind')
+    def handle(payload):
+        ...
+
+and queued with jobs.enqueue('kind', {...}). A handler may run more than
+once for the same job (retries, a worker dying mid-job), so it must be
+idempotent.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+# kind -> (handler, on_failure)
+_handlers = {}
+
+
+def register(kind, on_failure=None):
+    """Decorator registering a job handler.
+
+    on_failure(payload) is called once the job has failed max_attempts
+    times and won't be retried.
+    """
+    def decorator(handler):
+        _handlers[kind] = (handler, on_failure)
+        return handler
+    return decorator
+
+
+def autodiscover():
+    """Import the jobs modules of all installed apps."""
+    autodiscover_modules('jobs')
+
+
+def enqueue(kind, payload, key=None, max_attempts=None):
+    """Queue a job and return it.
+
+    key: idempotency key, if a job with this key already exists it's
+    returned instead of queueing another one.
+    """
+    if key is not None:
+        existing = Job.objects.filter(idempotency_key=key).first()
+        if existing is not None:
+            return existing
+
+    job = Job(
+        kind=kind,
+        payload=payload,
+        idempotency_key=key,
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # the same key was queued concurrently
+        if key is None:
+            raise
+        return Job.objects.get(idempotency_key=key)
+    return job
+
+
+def claim():
+    """Mark the next runnable job as running and return it (or None).
+
+    Jobs left running longer than JOB_TIMEOUT (their worker died) are
+    claimed again.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_TIMEOUT)
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Job.QUEUED, run_after__lte=now)
+            | Q(status=Job.RUNNING, locked_at__lt=stale)
+        ).order_by('id').first()
+        if job is None:
+            return None
+
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_at = now
+        job.save(update_fields=['status', 'attempts', 'locked_at',
+                                'updated_at'])
+    return job
+
+
+def run(job):
+    """Run a claimed job and record the outcome."""
+    handler, on_failure = _handlers.get(job.kind, (None, None))
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for {job.kind!r}.')
+        handler(job.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %d of %d).',
+                         job, job.attempts, job.max_attempts)
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            # exponential backoff
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1),
+            )
+        else:
+            job.status = Job.FAILED
+            if on_failure is not None:
+                on_failure(job.payload)
+    else:
+        job.status = Job.DONE
+        job.last_error = ''
+
+    job.locked_at = None
+    job.save(update_fields=['status', 'run_after', 'locked_at',
+                            'last_error', 'updated_at'])
+    return job
+
+
+def run_next():
+    """Claim and run the next job, return it (None when idle)."""
+    job = claim()
+    if job is not None:
+        run(job)
+    return job
+
+
+def run_pending():
+    """Run jobs until none is runnable, return how many ran."""
+    count = 0
+    while run_next() is not None:
+        count += 1
+    return count
+
+
+def purge(older_than):
+    """Delete jobs done (or given up) before older_than."""
+    return Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED], updated_at__lt=older_than,
+    ).delete()[0]
@@ -0,0 +1,55 @@
+"""
+Django command measuring password checks per second per core.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """Time the configured password hashers."""
+
+    help = 'Measure logins (password checks) per second per core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checks', type=int, default=20,
+            help='Password checks timed per hasher.',
+        )
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Threads checking at once (the hashers release the GIL, '
+                 'so throughput scales with cores).',
+        )
+
+    def _checks_per_second(self, hasher, encoded, checks, threads):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(
+                lambda _: hasher.verify('correct horse battery', encoded),
+                range(checks),
+            ))
+        if not all(results):
+            raise CommandError(f'{hasher.algorithm}: a check failed.')
+        return checks / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        # PASSWORD_HASHERS, the one of new passwords first
+        for hasher in get_hashers():
+            try:
+                encoded = hasher.encode(
+                    'correct horse battery', hasher.salt(),
+                )
+            except ValueError as exc:
+                # library not installed (argon2-cffi, bcrypt)
+                self.stdout.write(f'{hasher.algorithm}: {exc}')
+                continue
+            rate = self._checks_per_second(
+                hasher, encoded, options['checks'], options['threads'],
+            )
+            self.stdout.write(
+                f'{hasher.algorithm:<16}{rate:>10.1f} logins/s '
+                f'({rate / options["threads"]:.1f} per thread)'
+            )
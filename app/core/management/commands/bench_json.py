@@ -0,0 +1,110 @@
+"""
+Django command timing the JSON renderers on a page of recipes.
+"""
+from decimal import Decimal
+from io import BytesIO
+from timeit import timeit
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Ingredient, Recipe, Tag
+from core.renderers import ORJSONParser, ORJSONRenderer
+from recipe.serializers import RecipeSerializer
+
+
+class Rollback(Exception):
+    """Undo the recipes created for the benchmark."""
+
+
+class Command(BaseCommand):
+    """Compare DRF's JSON renderer/parser with core.renderers."""
+
+    help = 'Time rendering and parsing serialized recipes as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=1000,
+            help='Number of recipes serialized.',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Times each renderer/parser runs.',
+        )
+
+    def _recipes_data(self, count):
+        """Serialize count recipes created (then rolled back) for this."""
+        data = None
+        try:
+            with transaction.atomic():
+                user = get_user_model().objects.create_user(
+                    'bench-json@example.com', 'password',
+                )
+                tags = [
+                    Tag.objects.create(user=user, name=f'Tag {i}')
+                    for i in range(3)
+                ]
+                ingredients = [
+                    Ingredient.objects.create(
+                        user=user, name=f'Ingredient {i}',
+                    )
+                    for i in range(5)
+                ]
+                recipes = Recipe.objects.bulk_create(
+                    Recipe(
+                        user=user,
+                        title=f'Recipe {i}',
+                        time_minutes=i % 120,
+                        price=Decimal(i) / 100,
+                        link=f'https://example.com/recipe-{i}.pdf',
+                        description='Mix everything together. ' * 20,
+                    )
+                    for i in range(count)
+                )
+                for recipe in recipes:
+                    recipe.tags.set(tags)
+                    recipe.ingredients.set(ingredients)
+                queryset = Recipe.objects.filter(user=user).prefetch_related(
+                    'tags', 'ingredients',
+                ).defer('search_vector').order_by('-id')
+                data = RecipeSerializer(queryset, many=True).data
+                raise Rollback
+        except Rollback:
+            pass
+        return data
+
+    def _time(self, label, func, repeat):
+        seconds = timeit(func, number=repeat) / repeat
+        self.stdout.write(f'{label:<24}{seconds * 1000:>10.2f} ms')
+        return seconds
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        data = self._recipes_data(options['recipes'])
+
+        results = {}
+        for name, renderer in (
+            ('JSONRenderer', JSONRenderer()),
+            ('ORJSONRenderer', ORJSONRenderer()),
+        ):
+            results[name] = renderer.render(data)
+            self._time(name, lambda: renderer.render(data), repeat)
+
+        content = results['JSONRenderer']
+        for name, parser in (
+            ('JSONParser', JSONParser()),
+            ('ORJSONParser', ORJSONParser()),
+        ):
+            self._time(
+                name, lambda: parser.parse(BytesIO(content)), repeat,
+            )
+
+        if results['JSONRenderer'] == results['ORJSONRenderer']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Identical output ({len(content)} bytes).'
+            ))
+        else:
+            self.stdout.write(self.style.ERROR('The outputs differ.'))
@@ -0,0 +1,76 @@
+"""
+Django command measuring login throughput under concurrent clients.
+"""
+import json
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    """POST credentials to the login API from concurrent clients."""
+
+    help = 'Measure logins per second against a running server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', default='http://localhost:8000/api/user/login/',
+            help='Login URL of the server (sharing this database).',
+        )
+        parser.add_argument(
+            '--clients', type=int, default=8,
+            help='Number of concurrent clients.',
+        )
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Total number of logins.',
+        )
+
+    def _login(self, url, body):
+        request = Request(url, data=body, method='POST', headers={
+            'Content-Type': 'application/json',
+        })
+        start = time.perf_counter()
+        try:
+            with urlopen(request) as response:
+                response.read()
+                status = response.status
+        except HTTPError as exc:
+            status = exc.code
+        return status, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        email = f'bench-login-{uuid.uuid4().hex}@example.com'
+        password = uuid.uuid4().hex
+        user = get_user_model().objects.create_user(email, password)
+        body = json.dumps({'email': email, 'password': password}).encode()
+        try:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(options['clients']) as pool:
+                results = list(pool.map(
+                    lambda _: self._login(options['url'], body),
+                    range(options['requests']),
+                ))
+            elapsed = time.perf_counter() - start
+        finally:
+            user.delete()
+
+        failed = [status for status, _ in results if status != 200]
+        if failed:
+            raise CommandError(
+                f'{len(failed)} logins failed (HTTP {failed[0]}).'
+            )
+        latencies = sorted(seconds for _, seconds in results)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'{len(results)} logins, {options["clients"]} clients: '
+            f'{len(results) / elapsed:.1f} logins/s, '
+            f'median {statistics.median(latencies) * 1000:.0f} ms, '
+            f'p95 {p95 * 1000:.0f} ms'
+        )
@@ -0,0 +1,36 @@
+"""
+Django command deleting image files nothing references anymore.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import media
+
+
+class Command(BaseCommand):
+    """Garbage-collect recipe images and profile pictures."""
+
+    help = 'Delete image files no recipe or profile uses anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scan', action='store_true',
+            help='Also walk the media directories, to find files that '
+                 'predate reference counting (or were set in the admin).',
+        )
+        parser.add_argument(
+            '--grace', type=int, default=settings.MEDIA_GC_GRACE,
+            help='Keep files saved less than this many seconds ago.',
+        )
+
+    def handle(self, *args, **options):
+        deleted = media.collect_garbage(
+            timedelta(seconds=options['grace']), full=options['scan'],
+        )
+        for name in deleted:
+            self.stdout.write(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {len(deleted)} files.'
+        ))
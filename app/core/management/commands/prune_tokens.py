@@ -0,0 +1,24 @@
+"""
+Django command deleting the blacklist rows of expired JWT tokens.
+"""
+from django.core.management.base import BaseCommand
+
+from core import tokens
+
+
+class Command(BaseCommand):
+    """Prune the OutstandingToken/BlacklistedToken tables."""
+
+    help = 'Delete outstanding and blacklisted tokens that have expired.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Tokens deleted per query (default JWT_PRUNE_BATCH_SIZE).',
+        )
+
+    def handle(self, *args, **options):
+        count = tokens.prune_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {count} expired tokens.'
+        ))
@@ -0,0 +1,76 @@
+"""
+Django command running background jobs (see core.jobs).
+"""
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core import jobs, media, tokens, uploads
+
+
+class Command(BaseCommand):
+    """Run queued jobs until stopped (SIGTERM/SIGINT)."""
+
+    help = 'Run queued background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no job is runnable instead of waiting.',
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=settings.JOB_POLL_INTERVAL,
+            help='Seconds to wait between polls of an empty queue.',
+        )
+
+    def _stop(self, signum, frame):
+        # finish the current job first
+        self.stopping = True
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        handlers = {
+            signum: signal.signal(signum, self._stop)
+            for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            self._work(options)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def _work(self, options):
+        next_purge = timezone.now()
+        self.stdout.write('Running jobs...')
+
+        while not self.stopping:
+            close_old_connections()
+            job = jobs.run_next()
+            if job is not None:
+                self.stdout.write(f'{job}')
+                continue
+
+            if timezone.now() >= next_purge:
+                jobs.purge(timezone.now() - timedelta(
+                    seconds=settings.JOB_RETENTION,
+                ))
+                # abandoned chunked uploads
+                uploads.purge(timezone.now() - timedelta(
+                    seconds=settings.UPLOAD_SESSION_TTL,
+                ))
+                # image files nothing references anymore
+                media.collect_garbage(
+                    timedelta(seconds=settings.MEDIA_GC_GRACE),
+                )
+                # blacklist rows of expired JWT refresh tokens
+                if settings.JWT_PRUNE_TOKENS:
+                    tokens.prune_expired()
+                next_purge = timezone.now() + timedelta(hours=1)
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
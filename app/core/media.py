@@ -0,0 +1,132 @@
+"""
+Access control and garbage collection of image files (see core.storage).
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.images import FORMATS, VARIANTS
+from core.models import MediaBlob, Recipe, UserProfile, media_files
+from core.storage import image_storage
+
+# directories of files uploaded before they were named by content
+LEGACY_DIRS = ['uploads/recipe', 'uploads/userprofile']
+
+
+def _references(field, name):
+    """Q of rows whose image field (or one of its variants) is name."""
+    q = Q(**{field: name})
+    for variant in VARIANTS:
+        for fmt in FORMATS:
+            q |= Q(**{f'{field}_variants__{variant}__{fmt}': name})
+    return q
+
+
+def can_read(user_id, name):
+    """Whether one of user_id's recipes or profile uses the file name."""
+    return (
+        Recipe.objects.filter(
+            _references('image', name), user_id=user_id,
+        ).exists()
+        or UserProfile.objects.filter(
+            _references('picture', name), user_id=user_id,
+        ).exists()
+    )
+
+
+def _modified_before(name, cutoff, storage):
+    try:
+        return storage.get_modified_time(name) < cutoff
+    except FileNotFoundError:
+        return True
+
+
+def collect(grace, storage=image_storage):
+    """Delete files whose reference count dropped to 0.
+
+    grace: timedelta, files saved (or re-saved, see
+    ContentAddressedStorage) more recently are kept: a job may be
+    about to reference them. Returns the deleted names.
+    """
+    cutoff = timezone.now() - grace
+    candidates = MediaBlob.objects.filter(
+        refs=0, updated_at__lt=cutoff,
+    ).values_list('id', flat=True)
+    deleted = []
+    for blob_id in candidates.iterator():
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update(
+                skip_locked=True,
+            ).filter(id=blob_id, refs=0).first()
+            if blob is None or not _modified_before(
+                blob.name, cutoff, storage,
+            ):
+                continue
+            storage.delete(blob.name)
+            blob.delete()
+            deleted.append(blob.name)
+    return deleted
+
+
+def referenced_files():
+    """Return {name: references} computed from the recipes/profiles."""
+    refs = {}
+    for model, field in ((Recipe, 'image'), (UserProfile, 'picture')):
+        rows = model.objects.only(field, f'{field}_variants')
+        for instance in rows.iterator():
+            for name in media_files(instance, field):
+                refs[name] = refs.get(name, 0) + 1
+    return refs
+
+
+def _walk(storage, directory):
+    try:
+        dirs, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield f'{directory}/{name}'
+    for name in dirs:
+        yield from _walk(storage, f'{directory}/{name}')
+
+
+def scan(grace, storage=image_storage):
+    """Delete the stored files no recipe or profile references.
+
+    Unlike collect(), walks the files on disk, which also finds files
+    that never had a reference count: uploaded before this storage
+    existed, or attached in the admin. Missing counts of referenced
+    files are added. Returns the deleted names.
+    """
+    cutoff = timezone.now() - grace
+    refs = referenced_files()
+    counted = set(MediaBlob.objects.filter(
+        name__in=refs,
+    ).values_list('name', flat=True))
+    MediaBlob.objects.bulk_create(
+        [
+            MediaBlob(name=name, refs=count)
+            for name, count in refs.items() if name not in counted
+        ],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+    deleted = []
+    for directory in [getattr(storage, 'prefix', None), *LEGACY_DIRS]:
+        if directory is None:
+            continue
+        for name in _walk(storage, directory):
+            if name in refs or not _modified_before(name, cutoff, storage):
+                continue
+            storage.delete(name)
+            deleted.append(name)
+    MediaBlob.objects.filter(name__in=deleted).delete()
+    return deleted
+
+
+def collect_garbage(grace, full=False, storage=image_storage):
+    """Run collect() (and scan() when full), return the deleted names."""
+    deleted = collect(grace, storage)
+    if full:
+        deleted += scan(grace, storage)
+    return deleted
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+def merge_duplicates(apps, schema_editor):
+    """Merge tags/ingredients sharing a (user, name) before adding the
+    unique constraint, moving recipe links to the oldest row."""
+
+    Recipe = apps.get_model('core', 'Recipe')
+
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        Model = apps.get_model('core', model_name)
+        Through = getattr(Recipe, field).through
+        fk = f'{model_name.lower()}_id'
+
+        duplicates = (
+            Model.objects.values('user_id', 'name')
+            .annotate(count=models.Count('id'), keep=models.Min('id'))
+            .filter(count__gt=1)
+        )
+        for dup in duplicates:
+            extra_ids = list(
+                Model.objects.filter(user_id=dup['user_id'], name=dup['name'])
+                .exclude(id=dup['keep'])
+                .values_list('id', flat=True)
+            )
+            linked = set(
+                Through.objects.filter(**{fk: dup['keep']})
+                .values_list('recipe_id', flat=True)
+            )
+            moved = set(
+                Through.objects.filter(**{f'{fk}__in': extra_ids})
+                .values_list('recipe_id', flat=True)
+            )
+            Through.objects.bulk_create([
+                Through(recipe_id=recipe_id, **{fk: dup['keep']})
+                for recipe_id in moved - linked
+            ])
+            Model.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_userprofile'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations, models
+
+from core.operations import AddIndexConcurrently, RunPostgresSQL
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_unique_tag_ingredient_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(fields=['user', '-id'], name='tag_user_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-id'], name='ingredient_user_id_idx'),
+        ),
+        # reverse lookups on the M2M tables (tag/ingredient -> recipes),
+        # covering both columns for index-only semi-joins
+        RunPostgresSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS core_recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS core_recipe_tags_tag_recipe_idx;',
+        ),
+        RunPostgresSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS core_recipe_ingredients_ingredient_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS core_recipe_ingredients_ingredient_recipe_idx;',
+        ),
+    ]
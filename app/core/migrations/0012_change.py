@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_existing(apps, schema_editor):
+    """Log the existing recipes, tags and ingredients as changes."""
+
+    Change = apps.get_model('core', 'Change')
+    for model_name in ('Recipe', 'Tag', 'Ingredient'):
+        Model = apps.get_model('core', model_name)
+        rows = Model.objects.order_by('id').values_list('id', 'user_id')
+        Change.objects.bulk_create(
+            (
+                Change(
+                    user_id=user_id,
+                    model=model_name.lower(),
+                    object_id=object_id,
+                )
+                for object_id, user_id in rows.iterator()
+            ),
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0011_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('recipe', 'Recipe'), ('tag', 'Tag'), ('ingredient', 'Ingredient')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['model', 'object_id'], name='change_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['user', 'id'], name='change_user_id_idx'),
+        ),
+        migrations.RunPython(record_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from core.operations import AddIndexConcurrently, RunPostgresSQL
+
+# same document as recipe.search.search_vector()
+UPDATE_SEARCH_VECTOR = """
+UPDATE core_recipe r SET search_vector =
+    setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce((
+        SELECT string_agg(t.name, ' ') FROM core_recipe_tags rt
+        JOIN core_tag t ON t.id = rt.tag_id WHERE rt.recipe_id = r.id
+    ), '') || ' ' || coalesce((
+        SELECT string_agg(i.name, ' ') FROM core_recipe_ingredients ri
+        JOIN core_ingredient i ON i.id = ri.ingredient_id
+        WHERE ri.recipe_id = r.id
+    ), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(r.description, '')), 'C');
+"""
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        RunPostgresSQL(UPDATE_SEARCH_VECTOR, migrations.RunSQL.noop),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ),
+    ]
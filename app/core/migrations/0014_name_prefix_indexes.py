@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from core.operations import RunPostgresSQL
+
+# case insensitive prefix lookups (suggest API): UPPER(name) LIKE 'PRE%'.
+# Written as SQL: Django renders OpClass() inside index expressions as
+# (UPPER("name") text_pattern_ops), which Postgres rejects. The indexes
+# hold UPPER(name) alone, so they don't compete with the user_id indexes
+# for lookups by user; the planner combines them when both filter.
+PREFIX_INDEXES = [
+    (
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {table}_name_prefix_idx '
+        f'ON core_{table} ((UPPER(name)) text_pattern_ops);',
+        f'DROP INDEX CONCURRENTLY IF EXISTS {table}_name_prefix_idx;',
+    )
+    for table in ('tag', 'ingredient')
+]
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_recipe_search_vector'),
+    ]
+
+    operations = [
+        RunPostgresSQL(sql, reverse_sql)
+        for sql, reverse_sql in PREFIX_INDEXES
+    ]
@@ -0,0 +1,72 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+IMAGE_STATUSES = [('none', 'No image'), ('pending', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')]
+
+
+def set_existing_ready(apps, schema_editor):
+    """Images uploaded before are ready (without variants)."""
+    Recipe = apps.get_model('core', 'Recipe')
+    UserProfile = apps.get_model('core', 'UserProfile')
+    Recipe.objects.exclude(image__isnull=True).exclude(image='').update(
+        image_status='ready',
+    )
+    UserProfile.objects.exclude(picture__isnull=True).exclude(
+        picture__in=['', 'NONE'],
+    ).update(picture_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255, null=True, unique=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after', 'id'], name='job_queue_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=IMAGE_STATUSES, default='none', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_pending',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='picture_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='picture_status',
+            field=models.CharField(choices=IMAGE_STATUSES, default='none', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='picture_pending',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(set_existing_ready, migrations.RunPython.noop),
+    ]
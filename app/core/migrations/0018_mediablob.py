@@ -0,0 +1,62 @@
+from collections import Counter
+
+from django.db import migrations, models
+import core.models
+import core.storage
+
+
+def count_references(apps, schema_editor):
+    """Count the references to files stored before (named by uuid)."""
+    Recipe = apps.get_model('core', 'Recipe')
+    UserProfile = apps.get_model('core', 'UserProfile')
+    MediaBlob = apps.get_model('core', 'MediaBlob')
+    refs = Counter()
+    for model, field in ((Recipe, 'image'), (UserProfile, 'picture')):
+        rows = model.objects.values_list(field, f'{field}_variants')
+        for name, variants in rows.iterator():
+            names = {
+                value
+                for files in (variants or {}).values()
+                for value in files.values()
+                if isinstance(value, str)
+            }
+            if name and name != 'NONE':
+                names.add(name)
+            refs.update(names)
+    MediaBlob.objects.bulk_create(
+        [MediaBlob(name=name, refs=count) for name, count in refs.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.storage.get_image_storage, upload_to=core.models.image_file_path),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='picture',
+            field=models.ImageField(default='NONE', null=True, storage=core.storage.get_image_storage, upload_to=core.models.image_file_path),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('refs', 0)), fields=['updated_at'], name='mediablob_unreferenced_idx')],
+            },
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
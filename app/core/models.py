@@ -4,7 +4,10 @@ Database models.
 import uuid  # to generate uuid
 import os  # for file path management functions
 
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -12,8 +15,11 @@ from django.contrib.auth.models import (
 )
 from django.conf import settings
 from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 from datetime import date
 
+from core.storage import get_image_storage
+
 #  instance: of the object that the image is being uploaded to
 # filename:name of original file that's being uploaded
 def image_file_path(instance, filename):
@@ -32,6 +38,20 @@ def image_file_path(instance, filename):
     return os.path.join('uploads', model_class.lower(), filename)
 
 
+# processing state of an uploaded image (see core.images.queue_upload)
+IMAGE_NONE = 'none'
+IMAGE_PENDING = 'pending'
+IMAGE_READY = 'ready'
+IMAGE_FAILED = 'failed'
+
+IMAGE_STATUSES = [
+    (IMAGE_NONE, 'No image'),
+    (IMAGE_PENDING, 'Processing'),
+    (IMAGE_READY, 'Ready'),
+    (IMAGE_FAILED, 'Failed'),
+]
+
+
 # https://docs.djangoproject.com/en/3.2/topics/auth/customizing
 # /#writing-a-manager-for-a-custom-user-model
 # define UserManage based of BaseUserManager class provided by Django
@@ -76,6 +96,12 @@ class UserManager(BaseUserManager):
 
         return user
 
+    def get_by_natural_key(self, username):
+        """Return the user by email, with their profile (read at login)."""
+        return self.select_related('profile').get(
+            **{self.model.USERNAME_FIELD: username}
+        )
+
 
 # https://docs.djangoproject.com/en/3.2/topics/auth/customizing/#auth-custom-user
 # AbstractBaseUser: contains functionality for user auth system
@@ -129,7 +155,17 @@ class UserProfile(models.Model):
         (NONE, "Prefer not to say"),
     ]
 
-    picture = models.ImageField(default="NONE", null=True, upload_to=image_file_path)
+    picture = models.ImageField(default="NONE", null=True, upload_to=image_file_path,
+                                storage=get_image_storage)
+    # same as Recipe.image_variants/image_status/image_pending
+    picture_variants = models.JSONField(default=dict, blank=True,
+                                        editable=False)
+    picture_status = models.CharField(
+        max_length=20, choices=IMAGE_STATUSES, default=IMAGE_NONE,
+        editable=False,
+    )
+    picture_pending = models.CharField(max_length=255, blank=True,
+                                       editable=False)
     bio = models.CharField(max_length=225, blank=True)
     # private info
     dob = models.DateField(null=True, blank=True) #### something wrong with null here
@@ -149,6 +185,8 @@ class UserProfile(models.Model):
 
     # once we create a new feed item automatically add the date time stamp that the item was created
     created_on = models.DateTimeField(auto_now_add=True)
+    # last change, used for ETag/Last-Modified of the profile endpoints
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.user.id) #show how we want it to be displayed
@@ -214,7 +252,40 @@ class Recipe(models.Model):  # models.Model: Django base class
     # Note: recipe_image_file_path is a reference to a func, not calling it
     # That's how you specify the path you want to upload files to
     # NOT REQUIRED
-    image = models.ImageField(null=True, upload_to=image_file_path)
+    # files are named by content (see core.storage)
+    image = models.ImageField(null=True, upload_to=image_file_path,
+                              storage=get_image_storage)
+
+    # resized copies of the uploaded image (see core.images.process_image),
+    # {variant: {'width', 'height', 'webp': <file>, 'jpeg': <file>}};
+    # image then points at the 'full' JPEG variant
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    image_status = models.CharField(
+        max_length=20, choices=IMAGE_STATUSES, default=IMAGE_NONE,
+        editable=False,
+    )
+    # upload waiting to be processed into variants by a background job
+    image_pending = models.CharField(max_length=255, blank=True,
+                                     editable=False)
+
+    # last change of the recipe or of its representation
+    # (also touched when one of its tags/ingredients is renamed/deleted)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # full-text search document (title, tag/ingredient names, description)
+    # kept up to date by recipe.search.update_search_vector()
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # lists filter by user and show the newest recipes first
+            models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+            # ?q= search, within a user's recipes (combined with the
+            # user_id index) or across all of them; user_id isn't part
+            # of it, that needs btree_gin, which the app's database
+            # role usually can't install
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+        ]
 
     # returns string representation of an object (title here)
     # If not sepcified, in Django Admin you'll see ID instead of a title
@@ -232,6 +303,24 @@ class Tag(models.Model):
             on_delete=models.CASCADE,
         )
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # one tag per name for each user, so concurrent creates
+            # of the same tag can't produce duplicates
+            # (its unique index also serves lookups by (user, name))
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_tag_name_per_user',
+            ),
+        ]
+        # the suggest API's case insensitive prefix lookups use
+        # tag_name_prefix_idx on (UPPER(name) text_pattern_ops), made
+        # by migration 0014 (Django can't render that opclass)
+        indexes = [
+            models.Index(fields=['user', '-id'], name='tag_user_id_idx'),
+        ]
 
     # returns string representation of an object (name here)
     # If not sepcified, in Django Admin you'll see ID instead of a name
@@ -249,7 +338,303 @@ class Ingredient(models.Model):
         )
 
     name = models.CharField(max_length=225)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='unique_ingredient_name_per_user',
+            ),
+        ]
+        # and ingredient_name_prefix_idx (migration 0014), see Tag
+        indexes = [
+            models.Index(
+                fields=['user', '-id'], name='ingredient_user_id_idx',
+            ),
+        ]
 
     # returns string representation of an ingredient name
     def __str__(self):
         return self.name
+
+
+class ChangeManager(models.Manager):
+    """Manager for the sync change log."""
+
+    def record(self, objs, deleted=False, created=False):
+        """Record objs (recipes, tags or ingredients of one model) as changed.
+
+        Replaces the previous row of each object, so the log keeps only
+        the latest change (or tombstone) per object.
+        created: the objects are new, there's no previous row to delete.
+
+        Note: call this inside the transaction doing the write, so the
+        change becomes visible to sync together with the object.
+
+        Ids are the sync cursor, but are given out at insert and become
+        visible at commit: a transaction holding a lower id committing
+        after a client synced past a higher one would be skipped. So
+        the users' rows are locked (FOR NO KEY UPDATE, which doesn't
+        block inserts referencing them) until the transaction commits:
+        a user's changes are recorded one transaction at a time and
+        their ids become visible in increasing order.
+        """
+        objs = list(objs)
+        if not objs:
+            return
+
+        model = objs[0]._meta.model_name
+        with transaction.atomic(savepoint=False):
+            # ordered, so transactions lock several users without deadlock
+            list(
+                User.objects.select_for_update(no_key=True).filter(
+                    pk__in={obj.user_id for obj in objs},
+                ).order_by('pk').values_list('pk', flat=True)
+            )
+            if not created:
+                self.filter(
+                    model=model, object_id__in=[obj.pk for obj in objs],
+                ).delete()
+            self.bulk_create(
+                self.model(
+                    user_id=obj.user_id,
+                    model=model,
+                    object_id=obj.pk,
+                    deleted=deleted,
+                )
+                for obj in objs
+            )
+
+
+class Change(models.Model):
+    """Latest change of a user's recipe, tag or ingredient.
+
+    Used by the delta sync API: the auto-incremented id is the sync
+    cursor (committed in increasing order per user, see record()), and
+    deleted objects are kept as tombstones.
+    """
+
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+
+    MODELS = [
+        (RECIPE, 'Recipe'),
+        (TAG, 'Tag'),
+        (INGREDIENT, 'Ingredient'),
+    ]
+
+    # no database constraint/cascade: deleting a user deletes their
+    # recipes first, which records tombstones pointing at that user
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+    )
+    model = models.CharField(max_length=20, choices=MODELS)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    objects = ChangeManager()
+
+    class Meta:
+        indexes = [
+            # sync reads a user's changes after a cursor
+            models.Index(fields=['user', 'id'], name='change_user_id_idx'),
+            # record() replaces the previous row of an object
+            models.Index(
+                fields=['model', 'object_id'], name='change_object_idx',
+            ),
+        ]
+
+
+def record_change(sender, instance, created=False, **kwargs):
+    Change.objects.record([instance], created=created)
+
+
+def record_deletion(sender, instance, **kwargs):
+    Change.objects.record([instance], deleted=True)
+
+
+post_save.connect(record_change, sender=Recipe)
+post_save.connect(record_change, sender=Tag)
+post_save.connect(record_change, sender=Ingredient)
+post_delete.connect(record_deletion, sender=Recipe)
+post_delete.connect(record_deletion, sender=Tag)
+post_delete.connect(record_deletion, sender=Ingredient)
+
+
+class Job(models.Model):
+    """Background task run by the run_jobs management command."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # name of the handler registered with core.jobs.register()
+    kind = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    # enqueueing again with the same key returns the existing job
+    idempotency_key = models.CharField(
+        max_length=255, unique=True, null=True, blank=True,
+    )
+    status = models.CharField(max_length=20, choices=STATUSES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # not run before (retry backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    # when a worker claimed it, to requeue jobs of crashed workers
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # workers pick the oldest runnable job
+            models.Index(
+                fields=['status', 'run_after', 'id'], name='job_queue_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.pk} ({self.status})'
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a recipe image or profile picture.
+
+    The client sends the file in chunks (PUT with Content-Range), which
+    are appended to a file in MEDIA_ROOT, then finalizes the session.
+    """
+
+    RECIPE = 'recipe'
+    PROFILE = 'profile'
+
+    TARGETS = [
+        (RECIPE, 'Recipe image'),
+        (PROFILE, 'Profile picture'),
+    ]
+
+    OPEN = 'open'
+    COMPLETE = 'complete'
+    FAILED = 'failed'
+
+    STATUSES = [
+        (OPEN, 'Open'),
+        (COMPLETE, 'Complete'),
+        (FAILED, 'Failed'),
+    ]
+
+    # random so sessions can't be guessed
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4,
+                          editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    target = models.CharField(max_length=20, choices=TARGETS)
+    # recipe (or profile) the file is attached to
+    object_id = models.BigIntegerField()
+    filename = models.CharField(max_length=255)
+    # total size in bytes and hex SHA-256 of the whole file,
+    # both given by the client when creating the session
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    # bytes received so far (the next chunk starts there)
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUSES, default=OPEN)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.id)
+
+
+def media_files(instance, field):
+    """Return the storage names of the image files instance uses.
+
+    field: 'image' (Recipe) or 'picture' (UserProfile).
+    """
+    variants = getattr(instance, f'{field}_variants') or {}
+    names = {
+        value
+        for files in variants.values()
+        for value in files.values()
+        # skips 'width'/'height'
+        if isinstance(value, str)
+    }
+    name = getattr(instance, field).name
+    if name and name != instance._meta.get_field(field).get_default():
+        names.add(name)
+    return names
+
+
+class MediaBlobManager(models.Manager):
+
+    def acquire(self, names):
+        """Count one more reference to each of names."""
+        names = set(names)
+        self.bulk_create(
+            [MediaBlob(name=name) for name in names], ignore_conflicts=True,
+        )
+        self.filter(name__in=names).update(
+            refs=F('refs') + 1, updated_at=timezone.now(),
+        )
+
+    def release(self, names):
+        """Count one less reference to each of names.
+
+        Files left without references are deleted by gc_media.
+        """
+        self.filter(name__in=set(names), refs__gt=0).update(
+            refs=F('refs') - 1, updated_at=timezone.now(),
+        )
+
+
+class MediaBlob(models.Model):
+    """Reference count of an image file (Recipe.image/UserProfile.picture).
+
+    A recipe or profile holds one reference to each distinct file of
+    its image (see media_files), however many variants share it.
+    """
+
+    # storage name of the file
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = MediaBlobManager()
+
+    class Meta:
+        indexes = [
+            # gc_media looks up files nothing references anymore
+            models.Index(
+                fields=['updated_at'], condition=Q(refs=0),
+                name='mediablob_unreferenced_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.refs})'
+
+
+def release_recipe_image(sender, instance, **kwargs):
+    MediaBlob.objects.release(media_files(instance, 'image'))
+
+
+def release_profile_picture(sender, instance, **kwargs):
+    MediaBlob.objects.release(media_files(instance, 'picture'))
+
+
+post_delete.connect(release_recipe_image, sender=Recipe)
+post_delete.connect(release_profile_picture, sender=UserProfile)
@@ -0,0 +1,60 @@
+"""
+Custom migration operations.
+"""
+from django.contrib.postgres import operations as postgres_operations
+from django.contrib.postgres.indexes import PostgresIndex
+from django.db import migrations
+
+
+def is_postgres(schema_editor):
+    """Return True when migrating a Postgres database."""
+    return schema_editor.connection.vendor == 'postgresql'
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """Build an index without locking writes (CREATE INDEX CONCURRENTLY).
+
+    Other databases (e.g. SQLite for local test runs) get a plain
+    CREATE INDEX instead, and Postgres-only index types are skipped.
+    Migrations using it must set atomic = False.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if is_postgres(schema_editor):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state,
+            )
+        elif not isinstance(self.index, PostgresIndex):
+            migrations.AddIndex.database_forwards(
+                self, app_label, schema_editor, from_state, to_state,
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if is_postgres(schema_editor):
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state,
+            )
+        elif not isinstance(self.index, PostgresIndex):
+            migrations.AddIndex.database_backwards(
+                self, app_label, schema_editor, from_state, to_state,
+            )
+
+
+class RunPostgresSQL(migrations.RunSQL):
+    """RunSQL that only runs against Postgres databases."""
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if is_postgres(schema_editor):
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state,
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if is_postgres(schema_editor):
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state,
+            )
@@ -0,0 +1,303 @@
+"""
+Serializers for the core APIs.
+"""
+import re
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db import models
+from django.utils.translation import gettext as _
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+from core.images import media_url
+from core.models import Recipe, UploadSession, UserProfile
+
+
+class MediaImageField(serializers.ImageField):
+    """ImageField represented by a URL its owner's browser can fetch."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        return media_url(value.name, self.context.get('request'))
+
+
+class MediaImageMixin:
+    """Use MediaImageField for the model's image fields."""
+
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        models.ImageField: MediaImageField,
+    }
+
+
+def _names(request, param):
+    value = request.query_params.get(param)
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsMixin:
+    """Let GET requests pick the fields to render.
+
+    ?fields=id,title renders only those fields, ?expand=a,b adds fields
+    of Meta.expandable_fields ({name: field factory}), which aren't
+    rendered otherwise. Only the top-level serializer is affected
+    (nested serializers have no request in their context at init).
+
+    Views call project() so the columns and relations of the fields
+    left out aren't loaded. Meta.field_sources ({name: [model fields]})
+    gives the columns of fields that aren't model fields (method fields).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # None: all fields (as without the mixin)
+        self.sparse_fields = None
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        expand = _names(request, 'expand') or []
+        unknown = set(expand) - set(expandable)
+        if unknown:
+            raise serializers.ValidationError({
+                'expand': [_('Unknown field(s): %s.')
+                           % ', '.join(sorted(unknown))],
+            })
+        for name in expand:
+            self.fields[name] = expandable[name]()
+
+        fields = _names(request, 'fields')
+        if fields is None:
+            return
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({
+                'fields': [_('Unknown field(s): %s.')
+                           % ', '.join(sorted(unknown))],
+            })
+        for name in set(self.fields) - set(fields) - set(expand):
+            self.fields.pop(name)
+        self.sparse_fields = set(self.fields)
+
+    def project(self, queryset, always=()):
+        """Load only what the rendered fields need from queryset.
+
+        Defers the columns and skips the prefetches of fields left out
+        by ?fields=; without it queryset is returned unchanged.
+        always: model fields to load anyway (used by the view).
+        """
+        if self.sparse_fields is None:
+            return queryset
+
+        model = queryset.model
+        sources = getattr(self.Meta, 'field_sources', {})
+        columns, prefetch = set(always), []
+        for name, field in self.fields.items():
+            if name in sources:
+                columns.update(sources[name])
+                continue
+            source = field.source.split('.')[0]
+            try:
+                model_field = model._meta.get_field(source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many or model_field.one_to_many:
+                prefetch.append(source)
+            elif model_field.concrete:
+                columns.add(source)
+        return queryset.only(*columns).prefetch_related(*prefetch)
+
+
+def sparse_serializer(view):
+    """Return view's serializer if ?fields= picked its fields, else None."""
+    if (
+        view.request.method not in SAFE_METHODS
+        or 'fields' not in view.request.query_params
+    ):
+        return None
+    serializer = view.get_serializer()
+    if getattr(serializer, 'sparse_fields', None) is None:
+        return None
+    return serializer
+
+
+class ValuesSerializer:
+    """Render what a ModelSerializer renders, from .values() rows.
+
+    Read-only fast path of list responses: rows are plain dicts (no
+    model instances) and only values whose representation differs from
+    the column value (decimals, dates, ...) go through their field's
+    to_representation(). Many-to-many fields rendered by a nested
+    ModelSerializer are loaded for the whole page in one query.
+
+    serializer: the ModelSerializer instance to render like, with its
+    fields as picked by ?fields=/?expand=. Subclasses compute the
+    SerializerMethodFields with get_<name>(row) methods, from the
+    columns given by the serializer's Meta.field_sources.
+    """
+
+    # fields representing a (non-null) column value by the value itself
+    PLAIN_FIELDS = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.EmailField,
+        serializers.IntegerField,
+        serializers.ReadOnlyField,
+        serializers.SlugField,
+        serializers.URLField,
+    )
+
+    def __init__(self, serializer):
+        self.context = serializer.context
+        self.request = self.context.get('request')
+        self.model = serializer.Meta.model
+        self.pk = self.model._meta.pk.attname
+        sources = getattr(serializer.Meta, 'field_sources', {})
+
+        columns = [self.pk]
+        # [(name, function of the row)], None for many-to-many fields
+        self.getters = []
+        # {name: (ValuesSerializer of the related rows, query name)}
+        self.many = {}
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                columns.extend(sources.get(name, []))
+                self.getters.append((name, getattr(self, f'get_{name}')))
+                continue
+
+            model_field = self._model_field(field)
+            if isinstance(field, serializers.ListSerializer):
+                if not (
+                    model_field.many_to_many
+                    and isinstance(field.child, serializers.ModelSerializer)
+                ):
+                    raise ImproperlyConfigured(
+                        f'{name}: only many-to-many fields rendered by a '
+                        f'ModelSerializer are supported.'
+                    )
+                self.many[name] = (
+                    ValuesSerializer(field.child),
+                    model_field.related_query_name(),
+                )
+                self.getters.append((name, None))
+            elif model_field.concrete and not model_field.is_relation:
+                columns.append(model_field.attname)
+                self.getters.append((name, self._column_getter(
+                    model_field.attname,
+                    None if type(field) in self.PLAIN_FIELDS
+                    else field.to_representation,
+                )))
+            else:
+                raise ImproperlyConfigured(
+                    f'{name}: {type(field).__name__} of a relation is not '
+                    f'supported.'
+                )
+        self.columns = list(dict.fromkeys(columns))
+
+    def _model_field(self, field):
+        if '.' in field.source or field.source == '*':
+            raise ImproperlyConfigured(
+                f'{field.field_name}: source={field.source!r} is not '
+                f'supported.'
+            )
+        return self.model._meta.get_field(field.source)
+
+    @staticmethod
+    def _column_getter(column, convert):
+        if convert is None:
+            return lambda row: row[column]
+
+        def get(row):
+            value = row[column]
+            return None if value is None else convert(value)
+        return get
+
+    def values(self, queryset):
+        """Return queryset as the .values() rows to_representation() reads.
+
+        Annotations are kept (cursor pagination may order by them).
+        """
+        return queryset.prefetch_related(None).values(
+            *self.columns, *queryset.query.annotations,
+        )
+
+    def _related(self, name, ids):
+        """Return {id: [rendered related objects]} of a many field."""
+        child, query_name = self.many[name]
+        rows = list(child.model.objects.filter(
+            **{f'{query_name}__in': ids},
+        ).values(query_name, *child.columns))
+        groups = {}
+        for row, data in zip(rows, child.to_representation(rows)):
+            groups.setdefault(row[query_name], []).append(data)
+        return groups
+
+    def to_representation(self, rows):
+        """Return the list of rendered rows."""
+        rows = list(rows)
+        getters = dict(self.getters)
+        ids = [row[self.pk] for row in rows]
+        for name in self.many:
+            groups = self._related(name, ids) if ids else {}
+            getters[name] = (
+                lambda row, groups=groups: groups.get(row[self.pk], [])
+            )
+        getters = list(getters.items())
+        return [
+            {name: get(row) for name, get in getters}
+            for row in rows
+        ]
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for chunked upload sessions."""
+
+    # not needed for the profile picture (the user's profile)
+    object_id = serializers.IntegerField(required=False, allow_null=True)
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'target', 'object_id', 'filename', 'size', 'sha256',
+            'received', 'status',
+        ]
+        read_only_fields = ['id', 'received', 'status']
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                _('Size must be between 1 and %d bytes.')
+                % settings.UPLOAD_MAX_SIZE
+            )
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if not re.fullmatch(r'[0-9a-f]{64}', value):
+            raise serializers.ValidationError(
+                _('Expected a hex SHA-256 digest.')
+            )
+        return value
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        if attrs['target'] == UploadSession.PROFILE:
+            # a user has one profile, keyed by the user's id
+            attrs['object_id'] = user.id
+            exists = UserProfile.objects.filter(user=user).exists()
+        else:
+            exists = Recipe.objects.filter(
+                user=user, pk=attrs.get('object_id'),
+            ).exists()
+        if not exists:
+            raise serializers.ValidationError(
+                {'object_id': _('No such recipe or profile.')}
+            )
+        return attrs
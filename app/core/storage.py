@@ -0,0 +1,112 @@
+"""
+Content-addressed storage of recipe images and profile pictures.
+
+Files are named by the SHA-256 of their content, so the same image
+uploaded to several recipes (or profiles) is stored once. Nothing is
+deleted when a file stops being used: core.models.MediaBlob counts the
+references and the gc_media command removes unreferenced files.
+"""
+import hashlib
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import FileSystemStorage, storages
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import LazyObject
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files <prefix>/<ab>/<sha256><ext>.
+
+    Saving content that's already stored returns the existing name
+    (and refreshes its modification time, which gc_media checks so a
+    file isn't collected between being saved and being referenced).
+    """
+
+    def __init__(self, prefix='blobs', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def is_hashed(self, name):
+        """Whether name is content-addressed (its content never changes)."""
+        return name.startswith(f'{self.prefix}/')
+
+    def get_available_name(self, name, max_length=None):
+        # identical content may (and should) reuse the name
+        return name
+
+    def _save(self, name, content):
+        ext = os.path.splitext(name)[1].lower()
+        directory = self.path(self.prefix)
+        os.makedirs(directory, exist_ok=True)
+
+        # hash while writing to a temporary file, then move it in place
+        # (concurrent saves of the same content can't clash)
+        digest = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    out.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = f'{self.prefix}/{hexdigest[:2]}/{hexdigest}{ext}'
+            path = self.path(name)
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(tmp, self.file_permissions_mode or 0o644)
+                os.replace(tmp, path)
+                tmp = None
+        finally:
+            if tmp is not None:
+                os.remove(tmp)
+        return name
+
+
+class ImageStorage(LazyObject):
+    """Lazy STORAGES['images'], like default_storage for 'default'."""
+
+    def _setup(self):
+        self._wrapped = storages['images']
+
+
+image_storage = ImageStorage()
+
+
+def get_image_storage():
+    """Storage of Recipe.image and UserProfile.picture."""
+    return image_storage
+
+
+def _signer(name):
+    return signing.Signer(salt=f'core.storage.media:{name}')
+
+
+def media_token(name, user_id):
+    """Return a token letting user_id's browser fetch the file name.
+
+    Media is served by core.views.media to the owner only, <img> tags
+    can't send the Authorization header so URLs carry this token. It
+    expires between MEDIA_URL_TTL and twice that from now, and stays
+    the same meanwhile so browsers can cache the URL.
+    """
+    ttl = settings.MEDIA_URL_TTL
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return _signer(name).sign(f'{user_id}.{expires}')
+
+
+def media_token_user(name, token):
+    """Return the user id of a valid media_token() of name, else None."""
+    try:
+        user_id, expires = _signer(name).unsign(token).split('.')
+    except (signing.BadSignature, ValueError):
+        return None
+    if int(expires) < time.time():
+        return None
+    return int(user_id)
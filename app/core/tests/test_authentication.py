@@ -0,0 +1,112 @@
+"""
+Tests for the stateless JWT authentication.
+"""
+from decimal import Decimal
+from time import monotonic
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.authentication import clear_deactivated_user_ids, token_user
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class StatelessJWTAuthenticationTests(TestCase):
+    """Test access tokens are trusted without loading the user."""
+
+    def setUp(self):
+        # deleted users and list caches are keyed by ids, which repeat
+        cache.clear()
+        clear_deactivated_user_ids()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password',
+        )
+        Recipe.objects.create(
+            user=self.user, title='Recipe', time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}',
+        )
+
+    def test_user_not_loaded(self):
+        """Test listing recipes doesn't read the user's row."""
+        # the deactivated users are cached by the first request
+        self.client.get(RECIPES_URL, {'page_size': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        user_table = get_user_model()._meta.db_table
+        for query in queries.captured_queries:
+            self.assertNotIn(f'FROM "{user_table}"', query['sql'])
+
+    def test_deactivated_user(self):
+        """Test deactivating a user refuses their tokens."""
+        self.client.get(RECIPES_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_users_cached(self):
+        """Test deactivations not seen by this process apply after a TTL."""
+        self.client.get(RECIPES_URL)
+
+        # as from another process: no post_save here
+        get_user_model().objects.filter(id=self.user.id).update(
+            is_active=False,
+        )
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with patch('core.authentication.time') as mock_time:
+            mock_time.monotonic.return_value = monotonic() + 3600
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_string_claim(self):
+        """Test user ids given as strings are refused too."""
+        token = AccessToken.for_user(self.user)
+        token['user_id'] = str(self.user.id)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_user(self):
+        """Test deleting a user refuses their tokens."""
+        self.client.get(RECIPES_URL)
+
+        self.user.delete()
+        clear_deactivated_user_ids()  # as another process would, later
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_user_fields_loaded_on_access(self):
+        """Test the other fields of the user are read when needed."""
+        user = token_user(self.user.id)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, self.user.email)
@@ -0,0 +1,77 @@
+"""
+Tests for the system checks.
+"""
+from unittest.mock import patch
+
+from django.db import connections
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_connection_budget, check_hashing_threads
+
+
+@patch('core.checks.server_connection_limit', return_value=97)
+@patch.object(connections['default'], 'vendor', 'postgresql')
+@override_settings(
+    DB_PGBOUNCER=False, DB_RESERVED_CONNECTIONS=5, JOB_WORKERS=1,
+)
+class ConnectionBudgetCheckTests(SimpleTestCase):
+    """Test the database connection budget check."""
+
+    @override_settings(UWSGI_WORKERS=4, UWSGI_THREADS=2)
+    def test_budget_within_limit(self, patched_limit):
+        """Test no error when workers fit in max_connections."""
+
+        errors = check_connection_budget(None, databases=['default'])
+
+        self.assertEqual(errors, [])
+
+    @override_settings(UWSGI_WORKERS=16, UWSGI_THREADS=8)
+    def test_budget_exceeds_limit(self, patched_limit):
+        """Test an error when workers exceed max_connections."""
+
+        errors = check_connection_budget(None, databases=['default'])
+
+        self.assertEqual([e.id for e in errors], ['core.E001'])
+
+    @override_settings(UWSGI_WORKERS=4, UWSGI_THREADS=2, JOB_WORKERS=90)
+    def test_budget_counts_job_workers(self, patched_limit):
+        """Test run_jobs connections count against max_connections."""
+
+        errors = check_connection_budget(None, databases=['default'])
+
+        self.assertEqual([e.id for e in errors], ['core.E001'])
+
+    @override_settings(UWSGI_WORKERS=16, UWSGI_THREADS=8, DB_PGBOUNCER=True)
+    def test_budget_skipped_behind_pgbouncer(self, patched_limit):
+        """Test pgbouncer mode skips the check."""
+
+        errors = check_connection_budget(None, databases=['default'])
+
+        self.assertEqual(errors, [])
+        patched_limit.assert_not_called()
+
+    def test_budget_skipped_without_databases(self, patched_limit):
+        """Test the check doesn't touch the database unless asked to."""
+
+        errors = check_connection_budget(None)
+
+        self.assertEqual(errors, [])
+        patched_limit.assert_not_called()
+
+
+class HashingThreadsCheckTests(SimpleTestCase):
+    """Test the password hashing threads check."""
+
+    @override_settings(UWSGI_THREADS=4, PASSWORD_HASHING_THREADS=1)
+    def test_threads_left_for_the_api(self):
+        """Test no warning when hashing can't take every thread."""
+
+        self.assertEqual(check_hashing_threads(None), [])
+
+    @override_settings(UWSGI_THREADS=1, PASSWORD_HASHING_THREADS=1)
+    def test_hashing_takes_every_thread(self):
+        """Test a warning when logins can hold every uwsgi thread."""
+
+        errors = check_hashing_threads(None)
+
+        self.assertEqual([e.id for e in errors], ['core.W001'])
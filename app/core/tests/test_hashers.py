@@ -0,0 +1,114 @@
+"""
+Tests for the configurable password hashers.
+"""
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import authenticate, get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashers import hashing_slot
+
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+CREATE_USER_URL = reverse('user:create')
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHasherTests(TestCase):
+    """Test password hashes follow the settings."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+
+    def test_work_factor(self):
+        """Test new passwords use PASSWORD_PBKDF2_ITERATIONS."""
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=2000)
+    def test_rehashed_at_login(self):
+        """Test a hash of another work factor is upgraded at login."""
+        user = authenticate(
+            username='user@example.com', password='password123',
+        )
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+
+    @skipUnless(argon2, 'argon2-cffi is not installed')
+    @override_settings(
+        PASSWORD_HASHERS=[
+            'core.hashers.Argon2PasswordHasher',
+            'core.hashers.PBKDF2PasswordHasher',
+        ],
+        PASSWORD_ARGON2_MEMORY_COST=1024,
+        PASSWORD_ARGON2_PARALLELISM=1,
+    )
+    def test_upgraded_to_argon2(self):
+        """Test switching hasher rehashes the password at login."""
+        user = authenticate(
+            username='user@example.com', password='password123',
+        )
+
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$argon2id$'))
+        self.assertIn('m=1024', user.password)
+        self.assertTrue(user.check_password('password123'))
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=0)
+    def test_hashing_slots_busy(self):
+        """Test signups are refused while all hashing slots are busy."""
+        payload = {
+            'email': 'new@example.com',
+            'password': 'password123',
+            'name': 'New',
+        }
+
+        with hashing_slot():
+            res = APIClient().post(CREATE_USER_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=0)
+    def test_hashing_slots_busy_token(self):
+        """Test the token API is refused while slots are busy."""
+        payload = {'email': 'user@example.com', 'password': 'password123'}
+
+        with hashing_slot():
+            res = APIClient().post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=0)
+    def test_hashing_slots_busy_password_change(self):
+        """Test password changes are refused while slots are busy."""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with hashing_slot():
+            res = client.patch(ME_URL, {'password': 'newpassword123'})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password123'))
+
+    def test_bench_hashers(self):
+        """Test the benchmark times the configured hashers."""
+        out = StringIO()
+
+        call_command('bench_hashers', '--checks=2', stdout=out)
+
+        self.assertIn('pbkdf2_sha256', out.getvalue())
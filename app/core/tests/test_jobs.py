@@ -0,0 +1,93 @@
+"""
+Tests for the background job queue.
+"""
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+
+@override_settings(JOB_RETRY_DELAY=10)
+class JobQueueTests(TestCase):
+    """Test queueing, running and retrying jobs."""
+
+    def setUp(self):
+        self.handler = Mock()
+        self.on_failure = Mock()
+        jobs.register('test', on_failure=self.on_failure)(self.handler)
+
+    def test_run_job(self):
+        """Test a queued job is run with its payload."""
+        job = jobs.enqueue('test', {'value': 1})
+
+        self.assertEqual(jobs.run_pending(), 1)
+
+        self.handler.assert_called_once_with({'value': 1})
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(job.attempts, 1)
+
+    def test_enqueue_idempotency_key(self):
+        """Test a job is queued once per idempotency key."""
+        job1 = jobs.enqueue('test', {}, key='upload-1')
+        job2 = jobs.enqueue('test', {}, key='upload-1')
+
+        self.assertEqual(job1.id, job2.id)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_failed_job_retried_later(self):
+        """Test a failing job is queued again with a backoff."""
+        self.handler.side_effect = ValueError('boom')
+        job = jobs.enqueue('test', {})
+
+        jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('boom', job.last_error)
+        self.assertGreater(job.run_after, timezone.now())
+        # not runnable before run_after
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_job_fails_after_max_attempts(self):
+        """Test a job is given up after max_attempts."""
+        self.handler.side_effect = ValueError('boom')
+        job = jobs.enqueue('test', {'value': 1}, max_attempts=2)
+
+        for _ in range(2):
+            Job.objects.filter(id=job.id).update(run_after=timezone.now())
+            jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.on_failure.assert_called_once_with({'value': 1})
+
+    def test_stale_running_job_claimed_again(self):
+        """Test jobs of a crashed worker are run again."""
+        job = jobs.enqueue('test', {})
+        Job.objects.filter(id=job.id).update(
+            status=Job.RUNNING,
+            locked_at=timezone.now() - timedelta(hours=1),
+        )
+
+        self.assertEqual(jobs.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+
+    # closing connections inside the test's transaction would drop it
+    @patch('core.management.commands.run_jobs.close_old_connections')
+    def test_run_jobs_command(self, patched_close):
+        """Test run_jobs --once runs the queued jobs and exits."""
+        jobs.enqueue('test', {})
+        jobs.enqueue('test', {})
+
+        call_command('run_jobs', '--once')
+
+        self.assertEqual(self.handler.call_count, 2)
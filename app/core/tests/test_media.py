@@ -0,0 +1,259 @@
+"""
+Tests for content-addressed image storage and its garbage collection.
+"""
+import hashlib
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from time import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.media import collect_garbage, scan
+from core.models import MediaBlob, Recipe
+from core.storage import (
+    ContentAddressedStorage,
+    image_storage,
+    media_token,
+)
+
+
+class ContentAddressedStorageTests(TestCase):
+    """Test files are named by their content."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_named_by_content(self):
+        """Test the name is the SHA-256 of the content."""
+        digest = hashlib.sha256(b'image').hexdigest()
+
+        name = self.storage.save('uploads/x.JPG', ContentFile(b'image'))
+
+        self.assertEqual(name, f'blobs/{digest[:2]}/{digest}.jpg')
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'image')
+
+    def test_same_content_stored_once(self):
+        """Test saving identical content twice returns the same name."""
+        name1 = self.storage.save('a.jpg', ContentFile(b'image'))
+        name2 = self.storage.save('b.jpg', ContentFile(b'image'))
+        name3 = self.storage.save('c.jpg', ContentFile(b'other'))
+
+        self.assertEqual(name1, name2)
+        self.assertNotEqual(name1, name3)
+        directory = os.path.dirname(self.storage.path(name1))
+        self.assertEqual(os.listdir(directory), [os.path.basename(name1)])
+
+
+class GarbageCollectionTests(TestCase):
+    """Test unreferenced image files are deleted."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password',
+        )
+        self.names = []
+
+    def tearDown(self):
+        for name in self.names:
+            image_storage.delete(name)
+
+    def _save(self, name, content):
+        name = image_storage.save(name, ContentFile(content))
+        self.names.append(name)
+        return name
+
+    def _recipe(self, image):
+        return Recipe.objects.create(
+            user=self.user, title='Recipe', time_minutes=5,
+            price=Decimal('1.00'), image=image,
+        )
+
+    def test_released_files_collected(self):
+        """Test files are deleted once the last recipe using them is."""
+        name = self._save('x.jpg', b'shared image')
+        recipe1 = self._recipe(name)
+        recipe2 = self._recipe(name)
+        MediaBlob.objects.acquire([name])
+        MediaBlob.objects.acquire([name])
+
+        recipe1.delete()
+        collect_garbage(timedelta(0))
+        self.assertTrue(image_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+
+        recipe2.delete()
+        self.assertEqual(collect_garbage(timedelta(0)), [name])
+        self.assertFalse(image_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.exists())
+
+    def test_grace_period(self):
+        """Test recently saved files are kept."""
+        name = self._save('x.jpg', b'new image')
+        MediaBlob.objects.create(name=name)
+
+        self.assertEqual(collect_garbage(timedelta(hours=1)), [])
+        self.assertTrue(image_storage.exists(name))
+
+    def test_gc_media_command(self):
+        """Test the command deletes unreferenced files."""
+        name = self._save('x.jpg', b'old image')
+        MediaBlob.objects.create(name=name)
+
+        out = StringIO()
+        call_command('gc_media', '--grace=0', stdout=out)
+
+        self.assertIn(name, out.getvalue())
+        self.assertFalse(image_storage.exists(name))
+
+    def test_scan_legacy_files(self):
+        """Test files predating reference counts are collected by scan."""
+        # scan walks the whole storage, keep it away from MEDIA_ROOT
+        with tempfile.TemporaryDirectory() as location:
+            storage = ContentAddressedStorage(location=location)
+            os.makedirs(storage.path('uploads/recipe'))
+            used, orphan = 'uploads/recipe/used.jpg', 'uploads/recipe/x.jpg'
+            for name in (used, orphan):
+                with open(storage.path(name), 'wb') as file:
+                    file.write(b'uploaded before content-addressing')
+            unused_blob = storage.save('x.jpg', ContentFile(b'unused'))
+            self._recipe(used)
+
+            deleted = scan(timedelta(0), storage)
+
+            self.assertEqual(set(deleted), {orphan, unused_blob})
+            self.assertTrue(storage.exists(used))
+        self.assertEqual(MediaBlob.objects.get(name=used).refs, 1)
+
+
+class MediaViewTests(TestCase):
+    """Test image files are served to their owner only."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password',
+        )
+        self.name = image_storage.save('x.jpg', ContentFile(b'image data'))
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Recipe', time_minutes=5,
+            price=Decimal('1.00'), image=self.name,
+        )
+        self.url = reverse('media', args=[self.name])
+        self.client = APIClient()
+
+    def tearDown(self):
+        image_storage.delete(self.name)
+
+    def _authenticate(self, user):
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}',
+        )
+
+    def test_owner_with_api_url(self):
+        """Test the URL returned by the API serves the file."""
+        api = APIClient()
+        api.force_authenticate(self.user)
+        url = api.get(
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+        ).data['image']
+
+        # as an <img> tag would: without the Authorization header
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'image data')
+        self.assertEqual(
+            res['Cache-Control'], 'private, max-age=31536000, immutable',
+        )
+
+    def test_owner_with_authorization_header(self):
+        """Test the owner can fetch the file with their JWT."""
+        self._authenticate(self.user)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_other_user(self):
+        """Test files of other users' recipes aren't served."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password',
+        )
+        self._authenticate(other)
+
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 404)
+
+        res = self.client.get(
+            self.url, {'token': media_token(self.name, other.id)},
+        )
+        self.assertEqual(res.status_code, 404)
+
+    def test_anonymous(self):
+        """Test files aren't served without credentials."""
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 403)
+
+        # token of another file
+        res = self.client.get(
+            self.url, {'token': media_token('other.jpg', self.user.id)},
+        )
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(MEDIA_URL_TTL=1)
+    def test_expired_token(self):
+        """Test tokens stop working once expired."""
+        token = media_token(self.name, self.user.id)
+        res = self.client.get(self.url, {'token': token})
+        self.assertEqual(res.status_code, 200)
+
+        with patch('core.storage.time') as mock_time:
+            mock_time.time.return_value = time() + 10
+            res = self.client.get(self.url, {'token': token})
+
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT='/protected-media/')
+    def test_x_accel_redirect(self):
+        """Test the transfer is handed to nginx when configured."""
+        self._authenticate(self.user)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            res['X-Accel-Redirect'], f'/protected-media/{self.name}',
+        )
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res.content, b'')
+
+    def test_variants_served(self):
+        """Test every variant of the image can be fetched."""
+        thumb = image_storage.save('x.webp', ContentFile(b'thumb data'))
+        self.recipe.image_variants = {
+            'thumb': {'width': 1, 'height': 1, 'webp': thumb},
+        }
+        self.recipe.save()
+        self._authenticate(self.user)
+
+        res = self.client.get(reverse('media', args=[thumb]))
+
+        image_storage.delete(thumb)
+        self.assertEqual(res.status_code, 200)
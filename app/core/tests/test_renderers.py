@@ -0,0 +1,93 @@
+"""
+Tests for the orjson renderer and parser.
+"""
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import ORJSONParser, ORJSONRenderer
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the renderer writes what DRF's JSONRenderer writes."""
+
+    def assertSameOutput(self, data, **kwargs):
+        self.assertEqual(
+            ORJSONRenderer().render(data, **kwargs),
+            JSONRenderer().render(data, **kwargs),
+        )
+
+    def test_same_output(self):
+        """Test documents of every type render byte for byte the same."""
+        self.assertSameOutput({
+            'id': 1,
+            'title': 'Crème brûlée\u2028\u2029"quoted"',
+            'price': Decimal('5.50'),
+            'rating': 4.25,
+            'created': datetime(2023, 9, 1, 12, 30, tzinfo=timezone.utc),
+            'updated': datetime(
+                2023, 9, 1, 12, 30, 0, 123456,
+                tzinfo=timezone(timedelta(hours=2)),
+            ),
+            'day': date(2023, 9, 1),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'lazy': gettext_lazy('Invalid token.'),
+            'error': ErrorDetail('Required.', code='required'),
+            'tags': [{'id': 2, 'name': 'Vegan'}],
+            'variants': {1: None, 'thumb': True},
+        })
+
+    def test_none(self):
+        """Test an empty body is rendered for None."""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_indent(self):
+        """Test indented output (browsable API) matches too."""
+        self.assertSameOutput(
+            {'a': [1, 2]},
+            accepted_media_type='application/json; indent=4',
+        )
+
+    def test_large_integer(self):
+        """Test integers orjson can't encode are still rendered."""
+        self.assertSameOutput({'id': 2 ** 70})
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the parser reads what DRF's JSONParser reads."""
+
+    def test_parse(self):
+        """Test a document parses to the same data."""
+        content = '{"title": "Crème", "price": "5.50", "tags": [1, 2.5]}'
+
+        self.assertEqual(
+            ORJSONParser().parse(BytesIO(content.encode())),
+            JSONParser().parse(BytesIO(content.encode())),
+        )
+
+    def test_invalid(self):
+        """Test malformed JSON and NaN are rejected."""
+        for content in (b'{"title": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError):
+                ORJSONParser().parse(BytesIO(content))
+
+
+class BenchJSONCommandTests(TestCase):
+    """Test the benchmark command."""
+
+    def test_bench_json(self):
+        """Test the renderers are timed and give the same output."""
+        out = StringIO()
+
+        call_command('bench_json', '--recipes=5', '--repeat=1', stdout=out)
+
+        self.assertIn('ORJSONRenderer', out.getvalue())
+        self.assertIn('Identical output', out.getvalue())
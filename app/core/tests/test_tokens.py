@@ -0,0 +1,89 @@
+"""
+Tests for refresh token revocation checks and blacklist pruning.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+from core.tokens import CachedRefreshToken, prune_expired
+
+TOKEN_REFRESH_URL = reverse('user:token_refresh')
+
+
+class TokenTests(TestCase):
+    """Test refresh tokens are revoked and pruned."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password',
+        )
+        self.client = APIClient()
+
+    def _token(self, jti, expires_in, blacklisted=False):
+        now = timezone.now()
+        token = OutstandingToken.objects.create(
+            user=self.user, jti=jti, token=jti,
+            created_at=now, expires_at=now + expires_in,
+        )
+        if blacklisted:
+            BlacklistedToken.objects.create(token=token)
+        return token
+
+    def test_refresh_rotates_and_revokes(self):
+        """Test a refresh token can't be used twice."""
+        refresh = str(CachedRefreshToken.for_user(self.user))
+
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], refresh)
+
+        # the revocation is cached, the database isn't queried
+        with self.assertNumQueries(0):
+            res = self.client.post(TOKEN_REFRESH_URL, {'refresh': refresh})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_blacklisted_token_refused(self):
+        """Test tokens blacklisted elsewhere are refused."""
+        token = CachedRefreshToken.for_user(self.user)
+        BlacklistedToken.objects.create(
+            token=OutstandingToken.objects.get(jti=token['jti']),
+        )
+
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': str(token)})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prune_expired(self):
+        """Test expired tokens are deleted, in batches."""
+        for i in range(5):
+            self._token(f'expired-{i}', timedelta(days=-1), i % 2 == 0)
+        valid = self._token('valid', timedelta(days=1), True)
+
+        self.assertEqual(prune_expired(batch_size=2), 5)
+
+        self.assertEqual(list(OutstandingToken.objects.all()), [valid])
+        self.assertEqual(BlacklistedToken.objects.get().token, valid)
+
+    def test_prune_tokens_command(self):
+        """Test the command deletes expired tokens."""
+        self._token('expired', timedelta(days=-1))
+        out = StringIO()
+
+        call_command('prune_tokens', stdout=out)
+
+        self.assertIn('Deleted 1 expired tokens', out.getvalue())
+        self.assertFalse(OutstandingToken.objects.exists())
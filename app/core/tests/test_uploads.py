@@ -0,0 +1,259 @@
+"""
+Tests for the chunked upload APIs.
+"""
+import hashlib
+import os
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs, uploads
+from core.images import delete_variants
+from core.models import Recipe, UploadSession
+
+UPLOADS_URL = reverse('core:uploadsession-list')
+
+
+def session_url(session_id):
+    """Create and return an upload session URL."""
+    return reverse('core:uploadsession-detail', args=[session_id])
+
+
+def finalize_url(session_id):
+    """Create and return an upload session's finalize URL."""
+    return reverse('core:uploadsession-finalize', args=[session_id])
+
+
+def image_bytes(size=(300, 200)):
+    """Return a JPEG image (noise, so it's a few KB)."""
+    buffer = BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class UploadSessionTests(TestCase):
+    """Test resumable chunked uploads."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Sample recipe',
+            time_minutes=5,
+            price=Decimal('1.00'),
+        )
+        self.data = image_bytes()
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        delete_variants(self.recipe.image_variants)
+        self.user.profile.refresh_from_db()
+        delete_variants(self.user.profile.picture_variants)
+        for session in UploadSession.objects.all():
+            uploads.discard(session)
+
+    def _create(self, target='recipe', data=None, **params):
+        data = self.data if data is None else data
+        payload = {
+            'target': target,
+            'object_id': self.recipe.id,
+            'filename': 'photo.JPG',
+            'size': len(data),
+            'sha256': hashlib.sha256(data).hexdigest(),
+            **params,
+        }
+        return self.client.post(UPLOADS_URL, payload, format='json')
+
+    def _put(self, session_id, start, chunk, total=None):
+        end = start + len(chunk) - 1
+        total = len(self.data) if total is None else total
+        return self.client.put(
+            session_url(session_id), chunk,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{total}',
+        )
+
+    def _upload(self, session_id, data=None, chunk_size=4096):
+        data = self.data if data is None else data
+        for start in range(0, len(data), chunk_size):
+            res = self._put(
+                session_id, start, data[start:start + chunk_size], len(data),
+            )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res
+
+    def test_chunked_upload_recipe_image(self):
+        """Test uploading an image in chunks and attaching it."""
+        res = self._create()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        session_id = res.data['id']
+
+        res = self._upload(session_id)
+        self.assertEqual(res.data['received'], len(self.data))
+
+        res = self.client.post(finalize_url(session_id))
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['status'], UploadSession.COMPLETE)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'pending')
+
+        # the job deletes the assembled upload once its transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.run_pending()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertEqual(self.recipe.image_variants['full']['width'], 300)
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertFalse(default_storage.exists(
+            f'uploads/tmp/{session_id}.jpg'
+        ))
+
+    def test_finalize_twice_queues_once(self):
+        """Test a retried finalize doesn't queue the image again."""
+        session_id = self._create().data['id']
+        self._upload(session_id)
+
+        self.client.post(finalize_url(session_id))
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(jobs.run_pending(), 1)
+
+    def test_chunked_upload_profile_picture(self):
+        """Test uploading the profile picture in chunks."""
+        res = self._create(target='profile', object_id=None)
+        session_id = res.data['id']
+        self.assertEqual(res.data['object_id'], self.user.id)
+
+        self._upload(session_id)
+        self.client.post(finalize_url(session_id))
+        jobs.run_pending()
+
+        self.user.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.picture_status, 'ready')
+
+    def test_resume_upload(self):
+        """Test an upload resumes from the bytes received."""
+        session_id = self._create().data['id']
+        self._put(session_id, 0, self.data[:500])
+
+        res = self.client.get(session_url(session_id))
+        self.assertEqual(res.data['received'], 500)
+
+        # a chunk starting elsewhere is refused
+        res = self._put(session_id, 600, self.data[600:])
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['received'], 500)
+
+        res = self._put(session_id, 500, self.data[500:])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res = self.client.post(finalize_url(session_id))
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+
+    def test_finalize_incomplete_upload(self):
+        """Test finalizing before all bytes are received fails."""
+        session_id = self._create().data['id']
+        self._put(session_id, 0, self.data[:500])
+
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_checksum_mismatch(self):
+        """Test an upload not matching its SHA-256 is rejected."""
+        session_id = self._create(sha256='0' * 64).data['id']
+        self._upload(session_id)
+
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        session = UploadSession.objects.get(id=session_id)
+        self.assertEqual(session.status, UploadSession.FAILED)
+        self.assertFalse(default_storage.exists(uploads.part_name(session)))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'none')
+
+    def test_content_range_required(self):
+        """Test a chunk without a valid Content-Range is rejected."""
+        session_id = self._create().data['id']
+
+        res = self._put(session_id, 0, self.data, total=len(self.data) + 1)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        res = self.client.put(
+            session_url(session_id), self.data,
+            content_type='application/octet-stream',
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(UPLOAD_CHUNK_MAX_SIZE=100)
+    def test_chunk_too_large(self):
+        """Test chunks over UPLOAD_CHUNK_MAX_SIZE are refused."""
+        session_id = self._create().data['id']
+
+        res = self._put(session_id, 0, self.data[:200])
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+
+    @override_settings(UPLOAD_MAX_SIZE=100)
+    def test_file_too_large(self):
+        """Test sessions for files over UPLOAD_MAX_SIZE are refused."""
+        res = self._create()
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe(self):
+        """Test uploading to another user's recipe is refused."""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password',
+        )
+        recipe = Recipe.objects.create(
+            user=other, title='Other', time_minutes=5, price=Decimal('1'),
+        )
+
+        res = self._create(object_id=recipe.id)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_session(self):
+        """Test sessions of other users can't be read or written."""
+        session_id = self._create().data['id']
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password',
+        )
+        self.client.force_authenticate(other)
+
+        res = self._put(session_id, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_purge_abandoned_sessions(self):
+        """Test sessions untouched for too long are deleted."""
+        session_id = self._create().data['id']
+        self._put(session_id, 0, self.data[:500])
+        session = UploadSession.objects.get(id=session_id)
+        part = uploads.part_name(session)
+
+        self.assertEqual(uploads.purge(timezone.now() - timedelta(hours=1)), 0)
+        self.assertEqual(uploads.purge(timezone.now() + timedelta(hours=1)), 1)
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(part))
@@ -0,0 +1,88 @@
+"""
+Refresh token revocation checks and blacklist table maintenance.
+
+With ROTATE_REFRESH_TOKENS and BLACKLIST_AFTER_ROTATION every refresh
+writes an OutstandingToken and a BlacklistedToken row; prune_expired()
+deletes the rows of expired tokens, which can't be used anyway.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow, datetime_from_epoch
+
+
+def _blacklist_key(jti):
+    return f'jwt-blacklist:{jti}'
+
+
+class CachedRefreshToken(RefreshToken):
+    """RefreshToken caching whether its jti is blacklisted.
+
+    Tokens found not blacklisted are cached for JWT_BLACKLIST_CACHE_TTL
+    seconds. Blacklisting through this class updates the cache, so with
+    a cache shared by all processes a token is refused right away; with
+    per-process caches others may accept it for up to that long.
+    Blacklisted tokens are cached until they expire.
+    """
+
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        key = _blacklist_key(jti)
+        blacklisted = cache.get(key)
+        if blacklisted is None:
+            # OutstandingToken.jti is unique, so indexed
+            blacklisted = BlacklistedToken.objects.filter(
+                token__jti=jti,
+            ).exists()
+            cache.set(
+                key, blacklisted,
+                self._ttl() if blacklisted
+                else settings.JWT_BLACKLIST_CACHE_TTL,
+            )
+        if blacklisted:
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        result = super().blacklist()
+        cache.set(
+            _blacklist_key(self.payload[api_settings.JTI_CLAIM]),
+            True, self._ttl(),
+        )
+        return result
+
+    def _ttl(self):
+        """Seconds until the token expires (at least 1)."""
+        expires = datetime_from_epoch(self.payload['exp'])
+        return max(int((expires - aware_utcnow()).total_seconds()), 1)
+
+
+def prune_expired(batch_size=None, now=None):
+    """Delete the blacklist rows of expired tokens, return how many.
+
+    Deletes batch_size (default JWT_PRUNE_BATCH_SIZE) tokens at a time,
+    so each delete holds its locks briefly.
+    """
+    batch_size = batch_size or settings.JWT_PRUNE_BATCH_SIZE
+    now = now or timezone.now()
+    # expires_at has no index: walk the primary key instead, oldest
+    # (so expired) tokens first
+    expired = OutstandingToken.objects.filter(
+        expires_at__lte=now,
+    ).order_by('id').values_list('id', flat=True)
+    count, last_id = 0, 0
+    while True:
+        ids = list(expired.filter(id__gt=last_id)[:batch_size])
+        if not ids:
+            return count
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        count += len(ids)
+        last_id = ids[-1]
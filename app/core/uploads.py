@@ -0,0 +1,176 @@
+"""
+Resumable chunked uploads of recipe images and profile pictures.
+
+A session is created with the file's size and SHA-256, the client PUTs
+the file in chunks (Content-Range: bytes start-end/size), each streamed
+to a part file in MEDIA_ROOT, then finalizes it: the checksum is checked
+and the file is queued for processing like a multipart upload.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import default_storage
+
+from core import images
+from core.models import Job, Recipe, UploadSession, UserProfile
+
+# bytes read from the request (or the part file) at a time
+BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+# session target -> (image field, job kind)
+TARGETS = {
+    UploadSession.RECIPE: ('image', 'recipe_image'),
+    UploadSession.PROFILE: ('picture', 'profile_picture'),
+}
+
+
+class UploadError(ValueError):
+    """A chunk or finalize request that can't be applied."""
+
+
+class UploadConflict(UploadError):
+    """A chunk that doesn't start where the previous one ended."""
+
+
+def get_target(session):
+    """Return the recipe or profile the session uploads to, or None."""
+    if session.target == UploadSession.RECIPE:
+        queryset = Recipe.objects.defer('search_vector')
+    else:
+        queryset = UserProfile.objects.all()
+    return queryset.filter(
+        user_id=session.user_id, pk=session.object_id,
+    ).first()
+
+
+def extension(filename):
+    """Return the lowercase extension of a client file name ('' if odd)."""
+    ext = os.path.splitext(filename)[1].lower()
+    return ext if re.fullmatch(r'\.[a-z0-9]{1,10}', ext) else ''
+
+
+def part_name(session):
+    """Storage name of the file chunks are written to."""
+    return f'{images.UPLOAD_DIR}/{session.id}.part'
+
+
+def parse_content_range(header, size):
+    """Return (start, end) of a 'bytes start-end/size' header."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if match is None:
+        raise UploadError('Expected a "Content-Range: bytes start-end/size" '
+                          'header.')
+    start, end, total = map(int, match.groups())
+    if total != size or start > end or end >= size:
+        raise UploadError('Content-Range is outside of the file.')
+    return start, end
+
+
+def write_chunk(session, stream, content_range, storage=default_storage):
+    """Write the next chunk from stream, return the bytes received.
+
+    The body is copied BLOCK_SIZE bytes at a time, so memory use doesn't
+    depend on the chunk size. Chunks must be sent in order: one that
+    doesn't start at session.received raises UploadConflict (the client
+    should resume from session.received).
+    """
+    if session.status != UploadSession.OPEN:
+        raise UploadConflict(f'The upload is {session.status}.')
+    start, end = parse_content_range(content_range, session.size)
+    if start != session.received:
+        raise UploadConflict(
+            f'Expected a chunk starting at byte {session.received}.'
+        )
+
+    path = storage.path(part_name(session))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    remaining = end - start + 1
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'wb') as part:
+        part.seek(start)
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            part.write(block)
+            remaining -= len(block)
+        # drop what a previous, interrupted attempt left after this chunk
+        part.truncate()
+    if remaining:
+        raise UploadError('The chunk is shorter than its Content-Range.')
+
+    # a concurrent retry of the same chunk may have won the race
+    UploadSession.objects.filter(
+        pk=session.pk, received=start, status=UploadSession.OPEN,
+    ).update(received=end + 1)
+    session.refresh_from_db(fields=['received', 'status', 'updated_at'])
+    return session.received
+
+
+def checksum(name, storage=default_storage):
+    """Return the hex SHA-256 of a stored file, read in blocks."""
+    digest = hashlib.sha256()
+    with storage.open(name) as file:
+        for block in iter(lambda: file.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize(session, storage=default_storage):
+    """Check the uploaded file and queue it for processing.
+
+    Returns the job. Raises UploadError when parts are missing or the
+    checksum doesn't match (the session is then failed and its file
+    deleted, the upload has to start over). Finalizing a complete
+    session again returns the same job. Call it with the session row
+    locked (select_for_update) so concurrent finalizes run one by one.
+    """
+    if session.status == UploadSession.FAILED:
+        raise UploadError('The upload failed, start a new one.')
+    if session.received != session.size:
+        raise UploadError(
+            f'Only {session.received} of {session.size} bytes received.'
+        )
+    target = get_target(session)
+    if target is None:
+        raise UploadError('The recipe or profile no longer exists.')
+    key = f'upload_session:{session.id}'
+    field, kind = TARGETS[session.target]
+
+    if session.status == UploadSession.COMPLETE:
+        return Job.objects.filter(idempotency_key=key).first()
+
+    part = part_name(session)
+    if checksum(part, storage) != session.sha256:
+        storage.delete(part)
+        session.status = UploadSession.FAILED
+        session.save(update_fields=['status', 'updated_at'])
+        raise UploadError('The file does not match its SHA-256 checksum.')
+
+    # the job deletes this file once it's processed
+    upload = f'{images.UPLOAD_DIR}/{session.id}{extension(session.filename)}'
+    os.replace(storage.path(part), storage.path(upload))
+    job = images.queue_stored_upload(target, field, upload, kind, key=key)
+    session.status = UploadSession.COMPLETE
+    session.save(update_fields=['status', 'updated_at'])
+    return job
+
+
+def discard(session, storage=default_storage):
+    """Delete the session and its partial file."""
+    if session.status != UploadSession.COMPLETE:
+        storage.delete(part_name(session))
+    session.delete()
+
+
+def purge(older_than, storage=default_storage):
+    """Delete sessions untouched since older_than, return how many."""
+    sessions = UploadSession.objects.filter(updated_at__lt=older_than)
+    count = 0
+    for session in sessions.iterator():
+        discard(session, storage)
+        count += 1
+    return count
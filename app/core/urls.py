@@ -0,0 +1,16 @@
+"""
+URL mappings for the core APIs.
+"""
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
+
+from core import views
+
+router = DefaultRouter()
+router.register('uploads', views.UploadSessionViewSet)
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', include(router.urls)),
+]
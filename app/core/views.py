@@ -1,11 +1,166 @@
 """
 Core views for app.
 """
-from rest_framework.decorators import api_view
+import mimetypes
+from io import BytesIO
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import transaction
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+)
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_safe
+from drf_spectacular.utils import extend_schema, OpenApiTypes
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action, api_view
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from core import media as core_media, uploads
+from core.authentication import StatelessJWTAuthentication
+from core.models import UploadSession
+from core.serializers import UploadSessionSerializer
+from core.storage import image_storage, media_token_user
+
 
 @api_view(['GET'])
 def health_check(request):
     """Returns successful response."""
     return Response({'healthy': True})
+
+
+def _media_user_id(request, name):
+    token = request.GET.get('token')
+    if token is not None:
+        return media_token_user(name, token)
+    try:
+        auth = StatelessJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return auth[0].id if auth is not None else None
+
+
+@require_safe
+def media(request, name):
+    """Serve an image file to the owner of its recipe or profile.
+
+    The user comes from the Authorization header or from the token of
+    the URLs the APIs return (<img> tags can't send headers). Behind
+    nginx (MEDIA_ACCEL_REDIRECT set) the file is sent by nginx through
+    X-Accel-Redirect, otherwise (dev server) it's streamed from here.
+    Not a DRF view: browsers' image Accept headers would fail its
+    content negotiation.
+    """
+    user_id = _media_user_id(request, name)
+    if user_id is None:
+        return HttpResponseForbidden()
+    if not core_media.can_read(user_id, name):
+        raise Http404
+
+    if settings.MEDIA_ACCEL_REDIRECT:
+        response = HttpResponse(content_type=(
+            mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        ))
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_REDIRECT + quote(name)
+        )
+    else:
+        try:
+            response = FileResponse(image_storage.open(name))
+        except FileNotFoundError:
+            raise Http404
+    # private: shared caches mustn't serve it to other users
+    if image_storage.is_hashed(name):
+        # named by content, a new image gets a new name
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """Resumable chunked uploads of recipe images and profile pictures.
+
+    POST creates a session (target, object_id, filename, size, sha256),
+    PUT sends a chunk of the file as the raw body with a Content-Range
+    header, GET tells how many bytes were received (where to resume),
+    POST finalize/ checks the SHA-256 and queues the image processing.
+    """
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    permission_classes = [IsAuthenticated]
+    lookup_value_regex = '[0-9a-f-]{36}'
+
+    def get_queryset(self):
+        """Retrieve upload sessions of the authenticated user."""
+        return self.queryset.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        uploads.discard(instance)
+
+    @extend_schema(
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+    )
+    def update(self, request, pk=None):
+        """Write one chunk, sent as the raw request body."""
+        session = self.get_object()
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if length > settings.UPLOAD_CHUNK_MAX_SIZE:
+            return Response(
+                {'detail': 'Chunks are limited to %d bytes.'
+                 % settings.UPLOAD_CHUNK_MAX_SIZE},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        try:
+            # the body is never parsed, it's streamed to the part file
+            uploads.write_chunk(
+                session, request.stream or BytesIO(),
+                request.headers.get('Content-Range'),
+            )
+        except uploads.UploadConflict as exc:
+            return Response(
+                {'detail': str(exc), 'received': session.received},
+                status=status.HTTP_409_CONFLICT,
+            )
+        except uploads.UploadError as exc:
+            return Response(
+                {'detail': str(exc), 'received': session.received},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(self.get_serializer(session).data)
+
+    @extend_schema(request=None)
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """Check the complete file and queue it for processing.
+
+        Responds 202, the recipe's image_status (or the profile's
+        picture_status) is 'pending' until the job is done.
+        """
+        with transaction.atomic():
+            session = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=pk,
+            )
+            try:
+                uploads.finalize(session)
+            except uploads.UploadError as exc:
+                return Response(
+                    {'detail': str(exc)},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        return Response(
+            self.get_serializer(session).data,
+            status=status.HTTP_202_ACCEPTED,
+        )
@@ -0,0 +1,104 @@
+"""
+Per-user cache of the recipe API list responses.
+
+Cache keys include a per-user generation token. Any write by the user
+replaces the token, so every list cached before the write is simply
+never read again (it expires on its own).
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+# response headers stored along with the cached list data
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control')
+
+
+def _generation_key(user_id):
+    return f'recipe-api:generation:{user_id}'
+
+
+def get_generation(user_id):
+    """Return the current generation token of the user's data."""
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        generation = uuid.uuid4().hex
+        # another request may have set it in the meantime
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_generation(user_id):
+    """Invalidate all cached lists of the user.
+
+    Bumped right away, so the rest of this request misses the cache, and
+    again once the transaction commits, so a list cached meanwhile by a
+    concurrent request (from the not yet committed data) is dropped too.
+    """
+    def bump():
+        cache.set(_generation_key(user_id), uuid.uuid4().hex, timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def list_cache_key(request):
+    """Return the cache key of a list request of the authenticated user."""
+    user_id = request.user.id
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'recipe-api:list:{user_id}:{get_generation(user_id)}:{url}'
+
+
+class CachedListMixin:
+    """Serve list responses of authenticated users from the cache.
+
+    Successful writes through the viewset (create, update, destroy and
+    custom actions) invalidate the user's cached lists.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+
+        key = list_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            data, headers = cached
+            # answer conditional requests from the cached validators
+            return get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    headers.get('Last-Modified')
+                ),
+                response=Response(data, headers=headers),
+            )
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {
+                header: response[header]
+                for header in CACHED_HEADERS if header in response
+            }
+            cache.set(
+                key, (response.data, headers),
+                settings.RECIPE_LIST_CACHE_TIMEOUT,
+            )
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            bump_generation(request.user.id)
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,15 @@
+"""
+Background jobs of the recipe app.
+"""
+from core import jobs
+from core.images import process_upload, upload_failed
+from recipe.cache import bump_generation
+
+
+@jobs.register('recipe_image', on_failure=upload_failed)
+def process_recipe_image(payload):
+    """Create the variants of an uploaded recipe image."""
+    recipe = process_upload(payload)
+    if recipe is not None:
+        # cached lists still have the previous thumbnail
+        bump_generation(recipe.user_id)
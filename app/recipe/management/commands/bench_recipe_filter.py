@@ -0,0 +1,111 @@
+"""
+Django command to benchmark filtering recipes by tags.
+"""
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from core.models import Recipe, Tag
+
+
+class Rollback(Exception):
+    """Raised to undo the benchmark data."""
+
+
+class Command(BaseCommand):
+    """Time the recipe tag filters on a generated data set.
+
+    The data is created inside a transaction that is rolled back at the
+    end, so the command can be pointed at a dev database safely.
+    """
+
+    help = 'Benchmark tag filters (DISTINCT join vs semi-join).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100_000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--filter-tags', type=int, default=10)
+        parser.add_argument('--page-size', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(**options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _run(self, **options):
+        self.stdout.write('Generating data...')
+        user = get_user_model().objects.create_user(
+            'bench-recipe-filter@example.com', 'bench-password',
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}') for i in range(options['tags'])
+        )
+        recipes = Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    user=user,
+                    title=f'Recipe {i}',
+                    time_minutes=10,
+                    price=Decimal('5.00'),
+                    description='Lorem ipsum dolor sit amet. ' * 20,
+                )
+                for i in range(options['recipes'])
+            ),
+            batch_size=5000,
+        )
+        Through = Recipe.tags.through
+        Through.objects.bulk_create(
+            (
+                Through(recipe_id=recipe.id, tag_id=tag.id)
+                for recipe in recipes
+                for tag in random.sample(tags, options['tags_per_recipe'])
+            ),
+            batch_size=5000,
+        )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        tag_ids = [tag.id for tag in tags[:options['filter_tags']]]
+        base = Recipe.objects.filter(user=user)
+        links = Through.objects.filter(tag_id__in=tag_ids)
+        all_links = links.values('recipe_id').annotate(
+            matched=Count('tag_id'),
+        ).filter(matched=len(tag_ids))
+        strategies = {
+            'join + DISTINCT (old)':
+                base.filter(tags__id__in=tag_ids).distinct(),
+            'semi-join, match=any':
+                base.filter(id__in=links.values('recipe_id')),
+            'semi-join, match=all':
+                base.filter(id__in=all_links.values('recipe_id')),
+        }
+
+        self.stdout.write(
+            f"{options['recipes']} recipes, "
+            f"filtering by {len(tag_ids)} tags, "
+            f"page size {options['page_size']}:"
+        )
+        for name, queryset in strategies.items():
+            page = queryset.order_by('-id')[:options['page_size']]
+            timings = []
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                list(page)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            self.stdout.write(
+                f'  {name:<24} '
+                f'median {timings[len(timings) // 2] * 1000:8.2f} ms  '
+                f'max {timings[-1] * 1000:8.2f} ms'
+            )
@@ -0,0 +1,17 @@
+"""
+Pagination for the recipe APIs.
+"""
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the newest-first '-id' ordering.
+
+    Each page is fetched with 'WHERE id < <cursor> ORDER BY id DESC
+    LIMIT n', so page N costs the same as page 1 (no OFFSET scan).
+    """
+    ordering = '-id'
+    page_size = settings.API_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
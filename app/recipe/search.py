@@ -0,0 +1,117 @@
+"""
+Full-text search of recipes.
+
+On Postgres every recipe stores a weighted tsvector of its title (A),
+tag and ingredient names (B) and description (C) in search_vector,
+served by a GIN index. Other databases (SQLite test runs) fall back
+to case-insensitive substring matching.
+"""
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import (
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import Recipe
+
+# text search configuration (stemming, stop words) for vectors and queries
+SEARCH_CONFIG = 'english'
+
+# ranks are floats (real), which don't survive the round trip through a
+# pagination cursor exactly, so they're compared as integers
+RANK_SCALE = 1000000
+
+
+def _related_names(field):
+    """Subquery of the space separated tag/ingredient names of a recipe."""
+    through = getattr(Recipe, field).through
+    related = Recipe._meta.get_field(field).m2m_reverse_field_name()
+    names = through.objects.filter(
+        recipe_id=OuterRef('pk'),
+    ).values('recipe_id').annotate(
+        names=StringAgg(f'{related}__name', delimiter=' '),
+    ).values('names')
+    return Subquery(names)
+
+
+def search_vector():
+    """Return the expression computing a recipe's search_vector."""
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            _related_names('tags'), _related_names('ingredients'),
+            weight='B', config=SEARCH_CONFIG,
+        )
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(queryset, **fields):
+    """Update the recipes in queryset, recomputing their search_vector.
+
+    Call it after saving a recipe's title, description, tags or
+    ingredients, or renaming/deleting a tag or ingredient. fields are
+    extra values set by the same UPDATE query.
+    """
+    if connection.vendor == 'postgresql':
+        fields['search_vector'] = search_vector()
+    if fields:
+        queryset.update(**fields)
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """Filter recipes matching ?q= and order them by relevance.
+
+    q uses web search syntax ("quoted phrase", or, -excluded). The
+    ordering is also picked up by cursor pagination, most relevant
+    (then newest) recipes first.
+    """
+    search_param = 'q'
+
+    def get_search_terms(self, request):
+        return request.query_params.get(self.search_param, '').strip()
+
+    def get_ordering(self, request, queryset, view):
+        if self.get_search_terms(request):
+            return ('-search_rank', '-id')
+        return view.pagination_class.ordering
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        if connection.vendor == 'postgresql':
+            query = SearchQuery(
+                terms, config=SEARCH_CONFIG, search_type='websearch',
+            )
+            return queryset.filter(search_vector=query).annotate(
+                search_rank=Cast(
+                    SearchRank(F('search_vector'), query) * RANK_SCALE,
+                    IntegerField(),
+                ),
+            )
+
+        matching = Q()
+        for term in terms.split():
+            matching &= (
+                Q(title__icontains=term)
+                | Q(description__icontains=term)
+                | Q(id__in=Recipe.tags.through.objects.filter(
+                    tag__name__icontains=term).values('recipe_id'))
+                | Q(id__in=Recipe.ingredients.through.objects.filter(
+                    ingredient__name__icontains=term).values('recipe_id'))
+            )
+        return queryset.filter(matching).annotate(search_rank=Value(0))
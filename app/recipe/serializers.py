@@ -1,16 +1,81 @@
 """
 Serializers for recipe APIs
 """
+from django.utils import timezone
 from rest_framework import serializers
 
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    Change,
 )
+from core.images import queue_upload, srcsets, variant_urls
+from core.serializers import (
+    MediaImageMixin,
+    SparseFieldsMixin,
+    ValuesSerializer,
+)
+from recipe.search import update_search_vector
+
+
+def get_or_create_by_name(model, user, names):
+    """Return the user's tags/ingredients for names, creating missing ones.
+
+    Existing rows are looked up in one query and the missing ones are
+    inserted with a single bulk_create. Conflicting inserts (the same
+    name created concurrently) are ignored thanks to the unique
+    (user, name) constraint and picked up by the follow-up lookup.
+    bulk_create() doesn't send post_save, so the new rows are recorded
+    in the sync change log here.
+    """
+    names = list(dict.fromkeys(names))  # drop duplicates, keep order
+    if not names:
+        return []
+
+    objs = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    missing = [name for name in names if name not in objs]
+    if missing:
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        created = model.objects.filter(user=user, name__in=missing)
+        objs.update((obj.name, obj) for obj in created)
+        Change.objects.record(created, created=True)
+
+    return [objs[name] for name in names]
+
+
+class UniqueNameMixin:
+    """Refuse a name the user already gave another tag/ingredient.
+
+    Mirrors the unique (user, name) constraint, so renames answer 400
+    rather than failing on insert. Nested in recipes the names are
+    looked up (get_or_create_by_name), so they aren't checked there.
+    """
+
+    def validate_name(self, value):
+        if self.parent is not None:
+            return value
+        names = self.Meta.model.objects.filter(
+            user=self.context['request'].user, name=value,
+        )
+        if self.instance is not None:
+            names = names.exclude(pk=self.instance.pk)
+        if names.exists():
+            raise serializers.ValidationError(
+                f'You already have a {self.Meta.model._meta.verbose_name} '
+                f'named "{value}".'
+            )
+        return value
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, SparseFieldsMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredients."""
 
     class Meta:
@@ -19,7 +84,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin, SparseFieldsMixin,
+                    serializers.ModelSerializer):
     """Serializer for tags."""
 
     class Meta:
@@ -28,38 +94,164 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class SuggestionSerializer(serializers.Serializer):
+    """Serializer for tag/ingredient name suggestions."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    # number of the user's recipes using it
+    usage = serializers.IntegerField()
+
+
+def thumbnail_url(image_variants, request):
+    """URL of the small JPEG of a recipe's image_variants, if any."""
+    thumb = image_variants.get('thumb')
+    if thumb is None:
+        return None
+    return variant_urls({'thumb': thumb}, request)['thumb']['jpeg']
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """Save many recipes at once using bulk queries."""
+
+    def _set_related(self, recipes, model, field, existing_ids):
+        """Replace tags/ingredients of recipes with bulk queries.
+
+        recipes: list of (recipe, items) pairs, items is None when
+        the relation wasn't provided and should be left untouched.
+        existing_ids: ids of the recipes that were updated, not created.
+        """
+        recipes = [(recipe, items) for recipe, items in recipes
+                   if items is not None]
+        if not recipes:
+            return
+
+        auth_user = self.context['request'].user
+        objs = {
+            obj.name: obj
+            for obj in get_or_create_by_name(
+                model, auth_user,
+                [item['name'] for _, items in recipes for item in items],
+            )
+        }
+
+        through = getattr(Recipe, field).through
+        fk = f'{model._meta.model_name}_id'
+        # new recipes have no links to delete
+        replaced = [recipe.id for recipe, _ in recipes
+                    if recipe.id in existing_ids]
+        if replaced:
+            through.objects.filter(recipe_id__in=replaced).delete()
+        through.objects.bulk_create([
+            through(recipe_id=recipe.id, **{fk: objs[name].id})
+            for recipe, items in recipes
+            for name in dict.fromkeys(item['name'] for item in items)
+        ])
+
+    def create(self, validated_data):
+        """Create recipes."""
+        return self.update([None] * len(validated_data), validated_data)
+
+    def update(self, instances, validated_data):
+        """Create (instance is None) or update recipes."""
+        new, existing, update_fields = [], [], set()
+        tags, ingredients = [], []
+        recipes = []
+
+        for instance, attrs in zip(instances, validated_data):
+            item_tags = attrs.pop('tags', None)
+            item_ingredients = attrs.pop('ingredients', None)
+            if instance is None:
+                instance = Recipe(**attrs)
+                new.append(instance)
+                item_tags = item_tags or []
+                item_ingredients = item_ingredients or []
+            else:
+                attrs.pop('user', None)
+                # bulk_update() doesn't apply auto_now
+                attrs['updated_at'] = timezone.now()
+                for attr, value in attrs.items():
+                    setattr(instance, attr, value)
+                update_fields.update(attrs)
+                existing.append(instance)
+
+            recipes.append(instance)
+            tags.append((instance, item_tags))
+            ingredients.append((instance, item_ingredients))
+
+        Recipe.objects.bulk_create(new)
+        if existing:
+            Recipe.objects.bulk_update(existing, update_fields)
+        existing_ids = {instance.id for instance in existing}
+        self._set_related(tags, Tag, 'tags', existing_ids)
+        self._set_related(
+            ingredients, Ingredient, 'ingredients', existing_ids,
+        )
+        update_search_vector(
+            Recipe.objects.filter(id__in=[recipe.id for recipe in recipes]),
+        )
+        # bulk queries don't send post_save
+        Change.objects.record(new, created=True)
+        Change.objects.record(existing)
+
+        return recipes
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for recipes."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    thumbnail = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = [
             'id', 'title', 'time_minutes', 'price', 'link', 'tags',
-            'ingredients', 'description', 'image',
+            'ingredients', 'description', 'thumbnail',
         ]
         read_only_fields = ['id']
+        list_serializer_class = RecipeListSerializer
+        # detail fields lists can add with ?expand=
+        expandable_fields = {
+            'image_variants': serializers.SerializerMethodField,
+            'image_srcset': serializers.SerializerMethodField,
+        }
+        field_sources = {
+            'thumbnail': ['image_variants'],
+            'image_variants': ['image_variants'],
+            'image_srcset': ['image_variants'],
+        }
+
+    def get_thumbnail(self, recipe):
+        """URL of the small JPEG of the recipe image, if any."""
+        return thumbnail_url(
+            recipe.image_variants, self.context.get('request'),
+        )
+
+    def get_image_variants(self, recipe):
+        """{variant: {'width', 'height', 'webp': url, 'jpeg': url}}"""
+        return variant_urls(
+            recipe.image_variants, self.context.get('request'),
+        )
+
+    def get_image_srcset(self, recipe):
+        """{format: srcset attribute value}"""
+        return srcsets(recipe.image_variants, self.context.get('request'))
 
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed."""
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = get_or_create_by_name(
+            Tag, auth_user, [tag['name'] for tag in tags],
+        )
+        recipe.tags.add(*tag_objs)
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
         auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = get_or_create_by_name(
+            Ingredient, auth_user, [ingr['name'] for ingr in ingredients],
+        )
+        recipe.ingredients.add(*ingredient_objs)
 
     def create(self, validated_data):
         """Create a recipe."""
@@ -68,6 +260,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         self._get_or_create_tags(tags, recipe)
         self._get_or_create_ingredients(ingredients, recipe)
+        update_search_vector(Recipe.objects.filter(id=recipe.id))
 
         return recipe
 
@@ -86,25 +279,61 @@ class RecipeSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         instance.save()
+        update_search_vector(Recipe.objects.filter(id=instance.id))
         return instance
 
 
-class RecipeDetailSerializer(RecipeSerializer):
+class RecipeValuesSerializer(ValuesSerializer):
+    """RecipeSerializer output rendered from .values() rows."""
+
+    def get_thumbnail(self, row):
+        return thumbnail_url(row['image_variants'], self.request)
+
+    def get_image_variants(self, row):
+        return variant_urls(row['image_variants'], self.request)
+
+    def get_image_srcset(self, row):
+        return srcsets(row['image_variants'], self.request)
+
+
+class RecipeDetailSerializer(MediaImageMixin, RecipeSerializer):
     """Serializer for recipe detail view."""
 
+    image_variants = serializers.SerializerMethodField()
+    image_srcset = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'image', 'image_status', 'image_variants', 'image_srcset',
+        ]
+        # images are uploaded (and processed) through upload-image
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + [
+            'image', 'image_status',
+        ]
+        expandable_fields = {}
 
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(MediaImageMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipes."""
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
+        fields = ['id', 'image', 'image_status']
+        read_only_fields = ['id', 'image_status']
         extra_kwargs = {'image': {'required': 'True'}}
 
+    def update(self, instance, validated_data):
+        """Queue the uploaded image for processing into variants.
+
+        image keeps pointing at the current image until the job is done.
+        """
+        self.job = queue_upload(
+            instance, 'image', validated_data['image'], 'recipe_image',
+            key=self.context.get('idempotency_key'),
+        )
+        return instance
+
 
 ###########################################
 
@@ -0,0 +1,105 @@
+"""
+Delta sync of a user's recipes, tags and ingredients.
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+    Change,
+)
+from recipe import serializers
+
+# number of changes loaded (and their objects serialized) per query
+BATCH_SIZE = 500
+
+SERIALIZERS = {
+    Change.RECIPE: serializers.RecipeDetailSerializer,
+    Change.TAG: serializers.TagSerializer,
+    Change.INGREDIENT: serializers.IngredientSerializer,
+}
+
+
+def _querysets(user):
+    return {
+        Change.RECIPE: Recipe.objects.filter(user=user).prefetch_related(
+            'tags', 'ingredients',
+        ).defer('search_vector'),
+        Change.TAG: Tag.objects.filter(user=user),
+        Change.INGREDIENT: Ingredient.objects.filter(user=user),
+    }
+
+
+def _load_objects(querysets, changes):
+    """Return {model: {id: object}} for the changes that aren't deletions."""
+    ids = {}
+    for change in changes:
+        if not change.deleted:
+            ids.setdefault(change.model, []).append(change.object_id)
+
+    return {
+        model: querysets[model].in_bulk(object_ids)
+        for model, object_ids in ids.items()
+    }
+
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder).encode()
+
+
+def stream_changes(request, since, limit):
+    """Yield the JSON document of the user's changes after since.
+
+    {"changes": [{"cursor", "type", "id", "deleted", "data"}, ...],
+     "next": <cursor to pass as since>, "has_more": <bool>}
+
+    Changes are read BATCH_SIZE at a time and written out as soon as
+    they're serialized, so memory use doesn't grow with limit.
+    """
+    user = request.user
+    querysets = _querysets(user)
+    context = {'request': request}
+    cursor = since
+    remaining = limit
+    has_more = None
+    separator = b''
+
+    yield b'{"changes":['
+    while remaining:
+        batch = min(BATCH_SIZE, remaining)
+        changes = list(
+            Change.objects.filter(user=user, id__gt=cursor).order_by('id')
+            [:batch]
+        )
+        objects = _load_objects(querysets, changes)
+
+        for change in changes:
+            obj = objects.get(change.model, {}).get(change.object_id)
+            # an object deleted after its change was read is a tombstone
+            data = None
+            if obj is not None:
+                data = SERIALIZERS[change.model](obj, context=context).data
+            yield separator + _dumps({
+                'cursor': change.id,
+                'type': change.model,
+                'id': change.object_id,
+                'deleted': obj is None,
+                'data': data,
+            })
+            separator = b','
+
+        if changes:
+            cursor = changes[-1].id
+        remaining -= len(changes)
+        if len(changes) < batch:
+            has_more = False
+            break
+
+    if has_more is None:
+        has_more = Change.objects.filter(user=user, id__gt=cursor).exists()
+
+    yield b'],"next":' + _dumps(cursor) + b',"has_more":' + \
+        _dumps(has_more) + b'}'
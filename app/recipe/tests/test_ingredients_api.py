@@ -3,6 +3,7 @@ Tests for ingredients APIs.
 """
 from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
@@ -17,6 +18,7 @@ from recipe.serializers import IngredientSerializer
 
 # ingredients api that can be used in tests
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+SUGGEST_URL = reverse('recipe:ingredient-suggest')
 
 
 def create_user(email='userIng@example.com', password='testpass123'):
@@ -49,6 +51,8 @@ class PrivateIngredientsAPITests(TestCase):
     """Test authenticated API requests."""
 
     def setUp(self):
+        # list caches are keyed by user id, which repeat across tests
+        cache.clear()
         self.client = APIClient()
         self.user = create_user()
         self.client.force_authenticate(self.user)
@@ -73,7 +77,7 @@ class PrivateIngredientsAPITests(TestCase):
         # self.assertEqual(actual_value, expected_value)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # check if db data is same as serializer data
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """Test list of ingredients is limited to authenticated user."""
@@ -88,9 +92,9 @@ class PrivateIngredientsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
         # check that only 1 ingr is returned for auth user (self.user)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
     def test_update_ingredient(self):
         """Test updating ingredient name."""
@@ -107,6 +111,18 @@ class PrivateIngredientsAPITests(TestCase):
         ingredient.refresh_from_db()
         self.assertEqual(ingredient.name, payload['name'])
 
+    def test_update_ingredient_name_taken(self):
+        """Test renaming an ingredient to a name in use fails."""
+        Ingredient.objects.create(user=self.user, name='Cherry')
+        ingredient = Ingredient.objects.create(
+            user=self.user, name='Strawberry')
+
+        res = self.client.patch(detail_url(ingredient.id), {'name': 'Cherry'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.name, 'Strawberry')
+
     def test_delete_ingredient(self):
         """Test deleting ingredients."""
 
@@ -141,8 +157,8 @@ class PrivateIngredientsAPITests(TestCase):
         s1 = IngredientSerializer(in1)
         s2 = IngredientSerializer(in2)
 
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filter_ingredients_unique(self):
         """Test filtered ingredinets returns a unique list."""
@@ -168,4 +184,49 @@ class PrivateIngredientsAPITests(TestCase):
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
         # check that Albacore returns only once
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_suggest_ingredients(self):
+        """Test suggestions match the prefix, most used first."""
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        salmon = Ingredient.objects.create(user=self.user, name='salmon')
+        Ingredient.objects.create(user=self.user, name='Sugar')
+        Ingredient.objects.create(user=create_user('other@example.com'),
+                                  name='Sage')
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=Decimal('5.00'),
+            )
+            recipe.ingredients.add(salmon)
+
+        res = self.client.get(SUGGEST_URL, {'prefix': 'SAL'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': salmon.id, 'name': 'salmon', 'usage': 2},
+            {'id': salt.id, 'name': 'Salt', 'usage': 0},
+        ])
+        self.assertIn('max-age', res['Cache-Control'])
+
+    def test_suggest_ingredients_limited(self):
+        """Test at most SUGGEST_LIMIT suggestions are returned."""
+        for i in range(3):
+            Ingredient.objects.create(user=self.user, name=f'Pepper {i}')
+
+        with self.settings(SUGGEST_LIMIT=2):
+            res = self.client.get(SUGGEST_URL, {'prefix': 'pep'})
+
+        self.assertEqual(len(res.data), 2)
+
+    def test_suggest_includes_new_ingredient(self):
+        """Test cached suggestions are refreshed after a change."""
+        ing = Ingredient.objects.create(user=self.user, name='Basil')
+        self.client.get(SUGGEST_URL, {'prefix': 'bas'})
+
+        self.client.patch(detail_url(ing.id), {'name': 'Basmati'})
+        res = self.client.get(SUGGEST_URL, {'prefix': 'bas'})
+
+        self.assertEqual(res.data[0]['name'], 'Basmati')
@@ -1,24 +1,38 @@
 """
 Tests for recipe APIs.
 """
+from datetime import timedelta
 from decimal import Decimal
+from unittest import skipUnless
+from unittest.mock import patch
 import tempfile
 import os
 
 from PIL import Image  # Pillow Image library
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import jobs
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    Job,
 )
 
+from core.images import UPLOAD_DIR, delete_variants, queue_stored_upload
+from core.media import collect_garbage
+from recipe.pagination import IdCursorPagination
+from recipe.search import update_search_vector
 from recipe.serializers import (
     # recipe preview
     RecipeSerializer,
@@ -30,6 +44,13 @@ from recipe.serializers import (
 # recipe api that can be used in tests
 RECIPES_URL = reverse('recipe:recipe-list')
 
+# create/update many recipes at once
+BULK_URL = reverse('recipe:recipe-bulk')
+
+# upper bound of queries for listing recipes, regardless of how many
+# recipes (and nested tags/ingredients) are returned
+RECIPE_LIST_MAX_QUERIES = 4
+
 
 def detail_url(recipe_id):
     """Create and return a recipe detail URL."""
@@ -93,6 +114,8 @@ class PrivateRecipeAPITests(TestCase):
     # creates client and user
     # then authenticates client with that user
     def setUp(self):
+        # list caches are keyed by user id, which repeat across tests
+        cache.clear()
         self.client = APIClient()
         self.user = create_user(email='user@example.com', password='test123')
 
@@ -121,7 +144,7 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # check that data dict that was returned in the response
         # is equal to the data dict of the object passed through serializer
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipes is limited to authenticated user."""
@@ -142,7 +165,221 @@ class PrivateRecipeAPITests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_query_count(self):
+        """Test listing recipes doesn't run queries per recipe."""
+
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for _ in range(100):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertLessEqual(len(queries), RECIPE_LIST_MAX_QUERIES)
+
+    def test_list_recipes_sparse_fields(self):
+        """Test ?fields= renders and loads only the fields asked for."""
+        recipe = create_recipe(user=self.user, description='Long text')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'], [{'id': recipe.id, 'title': recipe.title}],
+        )
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('"description"', sql)
+        self.assertNotIn('core_recipe_tags', sql)
+
+    def test_list_recipes_expand(self):
+        """Test ?expand= adds detail fields to the list."""
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPES_URL, {
+            'fields': 'id,image_srcset',
+            'expand': 'image_srcset',
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data['results'][0]), {'id', 'image_srcset'},
+        )
+
+    def test_list_recipes_unknown_field(self):
+        """Test asking for a field that doesn't exist fails."""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'expand': 'secret'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_paginated(self):
+        """Test recipes are listed newest first, one page at a time."""
+
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [recipes[4].id, recipes[3].id],
+        )
+
+        seen = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            seen.extend(r['id'] for r in res.data['results'])
+
+        self.assertEqual(seen, [r.id for r in reversed(recipes)])
+
+    def test_list_recipes_page_size_capped(self):
+        """Test the requested page size can't exceed the maximum."""
+
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        with patch.object(IdCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPES_URL, {'page_size': 1000})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNotNone(res.data['next'])
+
+    def test_list_recipes_cached(self):
+        """Test repeated list requests are served from the cache."""
+
+        create_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_list_recipes_cache_invalidated_by_write(self):
+        """Test creating, updating or deleting refreshes cached lists."""
+
+        self.client.get(RECIPES_URL)
+        payload = {'title': 'Soup', 'time_minutes': 20, 'price': '3.00'}
+        res = self.client.post(RECIPES_URL, payload)
+        recipe_id = res.data['id']
+
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Soup']
+        )
+
+        self.client.patch(detail_url(recipe_id), {'title': 'Stew'})
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(
+            [r['title'] for r in res.data['results']], ['Stew']
+        )
+
+        self.client.delete(detail_url(recipe_id))
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data['results'], [])
+
+    def test_list_recipes_cache_invalidated_by_tag_update(self):
+        """Test renaming a tag refreshes the cached recipe lists."""
+
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        recipe.tags.add(tag)
+        self.client.get(RECIPES_URL)
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Brunch'}
+        )
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(
+            res.data['results'][0]['tags'][0]['name'], 'Brunch'
+        )
+
+    def test_get_recipe_detail_not_modified(self):
+        """Test a matching If-None-Match gets 304 until the recipe changes."""
+
+        recipe = create_recipe(user=self.user)
+        url = detail_url(recipe.id)
+        res = self.client.get(url)
+        etag = res['ETag']
+        self.assertIn('Last-Modified', res)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+        self.client.patch(url, {'title': 'Changed'})
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_recipes_not_modified(self):
+        """Test a matching If-None-Match on the list gets 304."""
+
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL)
+        etag = res['ETag']
+
+        # answered from the aggregate, without serializing recipes
+        cache.clear()
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # and from the cached validators once the list is cached
+        self.client.get(RECIPES_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        create_recipe(user=self.user)
+        cache.clear()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_tag_rename_changes_recipe_etag(self):
+        """Test renaming a tag changes the ETag of recipes showing it."""
+
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        recipe.tags.add(tag)
+        url = detail_url(recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Brunch'}
+        )
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Brunch')
+
+    def test_get_recipe_detail_query_count(self):
+        """Test recipe detail loads tags and ingredients in batches."""
+
+        recipe = create_recipe(user=self.user)
+        for i in range(10):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'I{i}')
+            )
+
+        # recipe, tags and ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 10)
 
     def test_get_recipe_detail(self):
         """Test get recipe detail."""
@@ -488,6 +725,45 @@ class PrivateRecipeAPITests(TestCase):
             ).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_with_many_ingredients_query_count(self):
+        """Test ingredients are resolved in bulk when creating a recipe."""
+
+        Ingredient.objects.create(user=self.user, name='Ingredient 0')
+        payload = {
+            'title': 'Big stew',
+            'time_minutes': 90,
+            'price': Decimal('12.00'),
+            'ingredients': [{'name': f'Ingredient {i}'} for i in range(30)],
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertLessEqual(len(queries), 13)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 30
+        )
+
+    def test_create_recipe_with_duplicate_tag_names(self):
+        """Test repeating a tag name in the payload creates one tag."""
+
+        payload = {
+            'title': 'Toast',
+            'time_minutes': 5,
+            'price': Decimal('1.00'),
+            'tags': [{'name': 'Breakfast'}, {'name': 'Breakfast'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_create_ingredient_on_update(self):
         """Test creating an ingredient when updating a recipe."""
 
@@ -566,9 +842,9 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_ingredients(self):
         """Test filtering recipes by ingredients."""
@@ -594,15 +870,267 @@ class PrivateRecipeAPITests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_by_tags_match_all(self):
+        """Test match=all returns recipes having every requested tag."""
+
+        r1 = create_recipe(user=self.user, title='Pad Thai')
+        r2 = create_recipe(user=self.user, title='Green Curry')
+        r3 = create_recipe(user=self.user, title='Pancakes')
+
+        t1 = Tag.objects.create(user=self.user, name='Thai')
+        t2 = Tag.objects.create(user=self.user, name='Dinner')
+
+        r1.tags.add(t1, t2)
+        r2.tags.add(t1)
+        r3.tags.add(t2)
+
+        params = {'tags': f'{t1.id},{t2.id}', 'match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_by_tags_no_duplicates(self):
+        """Test a recipe matching several tags is returned once."""
+
+        recipe = create_recipe(user=self.user)
+        t1 = Tag.objects.create(user=self.user, name='Vegan')
+        t2 = Tag.objects.create(user=self.user, name='Quick')
+        recipe.tags.add(t1, t2)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                RECIPES_URL, {'tags': f'{t1.id},{t2.id}'}
+            )
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+        self.assertNotIn('DISTINCT', queries[0]['sql'])
+
+    def test_search_recipes(self):
+        """Test searching recipes by title, description, tags, ingredients."""
+
+        r1 = create_recipe(user=self.user, title='Tomato soup')
+        r2 = create_recipe(user=self.user, title='Stew',
+                           description='Slow cooked with tomatoes')
+        r3 = self.client.post(RECIPES_URL, {
+            'title': 'Salad', 'time_minutes': 5, 'price': Decimal('3.00'),
+            'ingredients': [{'name': 'Tomato'}],
+        }, format='json').data['id']
+        r4 = create_recipe(user=self.user, title='Pancakes')
+        create_recipe(
+            user=create_user(email='other@example.com', password='test123'),
+            title='Tomato pie',
+        )
+        update_search_vector(Recipe.objects.filter(id__in=[r1.id, r2.id]))
+
+        res = self.client.get(RECIPES_URL, {'q': 'tomato'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = {recipe['id'] for recipe in res.data['results']}
+        self.assertEqual(ids, {r1.id, r2.id, r3})
+        self.assertNotIn(r4.id, ids)
+
+    def test_search_recipes_after_tag_rename(self):
+        """Test renaming a tag updates the search results."""
+
+        recipe = create_recipe(user=self.user, title='Soup')
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag)
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Brunch'},
+        )
+        res = self.client.get(RECIPES_URL, {'q': 'brunch'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [recipe.id])
+
+    @skipUnless(connection.vendor == 'postgresql', 'ranking needs Postgres')
+    def test_search_recipes_ranked(self):
+        """Test title matches rank above description matches."""
+
+        r1 = create_recipe(user=self.user, title='Stew',
+                           description='Great with noodles')
+        r2 = create_recipe(user=self.user, title='Noodles')
+        update_search_vector(Recipe.objects.all())
+
+        res = self.client.get(RECIPES_URL, {'q': 'noodle'})
+
+        ids = [recipe['id'] for recipe in res.data['results']]
+        self.assertEqual(ids, [r2.id, r1.id])
+
+
+class BulkRecipeAPITests(TestCase):
+    """Test the batch recipe create/update API."""
+
+    def setUp(self):
+        # list caches are keyed by user id, which repeat across tests
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test123')
+        self.client.force_authenticate(self.user)
+
+    def _bulk_payload(self, count, prefix=''):
+        """Recipes sharing the Dinner tag, each with a new tag."""
+        return [
+            {
+                'title': f'{prefix}Recipe {i}',
+                'time_minutes': 10,
+                'price': '2.50',
+                'tags': [{'name': 'Dinner'}, {'name': f'{prefix}Tag {i}'}],
+                'ingredients': [{'name': f'{prefix}Salt'}],
+            }
+            for i in range(count)
+        ]
+
+    def test_bulk_create_recipes(self):
+        """Test creating many recipes with shared tags in one request."""
+
+        Tag.objects.create(user=self.user, name='Dinner')
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(
+                BULK_URL, self._bulk_payload(5, 'Small '), format='json',
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(
+                BULK_URL, self._bulk_payload(20), format='json',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        # the number of queries doesn't grow with the number of recipes
+        self.assertEqual(len(queries), len(small_batch))
+        self.assertEqual(len(res.data), 20)
+        self.assertEqual(res.data[0]['title'], 'Recipe 0')
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 25)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 26)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(), 2
+        )
+        recipe = Recipe.objects.get(id=res.data[5]['id'])
+        self.assertEqual(
+            sorted(tag.name for tag in recipe.tags.all()),
+            ['Dinner', 'Tag 5'],
+        )
+
+    def test_bulk_update_recipes(self):
+        """Test items with an id update the existing recipe."""
+
+        recipe = create_recipe(user=self.user, title='Old title')
+        tag = Tag.objects.create(user=self.user, name='Old tag')
+        recipe.tags.add(tag)
+        payload = [
+            {
+                'id': recipe.id,
+                'title': 'New title',
+                'time_minutes': 5,
+                'price': '1.00',
+                'tags': [{'name': 'New tag'}],
+            },
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+        self.assertEqual(
+            [tag.name for tag in recipe.tags.all()], ['New tag']
+        )
+
+    def test_bulk_invalid_item_returns_errors(self):
+        """Test an invalid item returns per-item errors, saves nothing."""
+
+        payload = [
+            {'title': 'Good', 'time_minutes': 5, 'price': '1.00'},
+            {'title': 'Missing price', 'time_minutes': 5},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('price', res.data[1])
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+
+    def test_bulk_update_other_users_recipe_error(self):
+        """Test another user's recipe can't be updated in bulk."""
+
+        other_user = create_user(email='other@example.com', password='pass123')
+        recipe = create_recipe(user=other_user)
+        payload = [
+            {'id': recipe.id, 'title': 'Hijacked', 'time_minutes': 5,
+             'price': '1.00'},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.title, 'Hijacked')
+
+    def test_bulk_duplicate_id_error(self):
+        """Test an id given twice in one batch is refused."""
+
+        recipe = create_recipe(user=self.user, title='Old title')
+        item = {
+            'id': recipe.id, 'title': 'New title', 'time_minutes': 5,
+            'price': '1.00', 'tags': [{'name': 'Dinner'}],
+        }
+
+        res = self.client.post(BULK_URL, [item, item], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertEqual(res.data[1], {'id': ['Duplicate id.']})
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Old title')
+
+    def test_bulk_id_types(self):
+        """Test numeric string ids update, other ids are invalid."""
+
+        recipe = create_recipe(user=self.user, title='Old title')
+        item = {'title': 'New title', 'time_minutes': 5, 'price': '1.00'}
+
+        res = self.client.post(
+            BULK_URL, [{'id': str(recipe.id), **item}], format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'New title')
+
+        res = self.client.post(
+            BULK_URL, [{'id': 'abc', **item}], format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('id', res.data[0])
+
+    @override_settings(RECIPE_BULK_MAX_BATCH_SIZE=2)
+    def test_bulk_max_batch_size(self):
+        """Test batches over the configured size are rejected."""
+
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00'}
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
 
 
 class ImageUploadTests(TestCase):
     """Tests for the image uploads API"""
 
     def setUp(self):
+        # list caches are keyed by user id, which repeat across tests
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             'user@example.com',
@@ -613,9 +1141,10 @@ class ImageUploadTests(TestCase):
 
     def tearDown(self):  # runs after every test
 
-        # deletes image created
+        # deletes images created
         # Reason: to not build up many images on the system
-        self.recipe.image.delete()
+        self.recipe.refresh_from_db()
+        delete_variants(self.recipe.image_variants)
 
     def test_upload_image(self):
         """Test uploading image to a recipe."""
@@ -636,15 +1165,194 @@ class ImageUploadTests(TestCase):
             # multipart: has text and binary data
             res = self.client.post(url, payload, format='multipart')
 
+        # the image is processed by a background job
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['image_status'], 'pending')
+        jobs.run_pending()
+
         # rfresh self.recipe created in setUp
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.recipe.image_status, 'ready')
         # check that image is in the res.data response
         self.assertIn('image', res.data)
         # check that the path of image on the recipe exists
         # so that we know it was successfuly uploaded
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    def _upload(self, img, run_jobs=True, headers=None, **save_kwargs):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img.save(image_file, format='JPEG', **save_kwargs)
+            image_file.seek(0)
+            res = self.client.post(
+                image_upload_url(self.recipe.id), {'image': image_file},
+                format='multipart', **(headers or {}),
+            )
+        if run_jobs:
+            jobs.run_pending()
+        return res
+
+    def test_upload_image_pending_until_processed(self):
+        """Test the previous image is served until the job is done."""
+
+        self._upload(Image.new('RGB', (10, 10)))
+        self.recipe.refresh_from_db()
+        first = self.recipe.image.name
+
+        self._upload(Image.new('RGB', (10, 10), 'red'), run_jobs=False)
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_status'], 'pending')
+        self.assertIn(first, res.data['image'])
+
+        jobs.run_pending()
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_status'], 'ready')
+        self.assertNotIn(first, res.data['image'])
+
+    def test_upload_image_idempotency_key(self):
+        """Test a retried upload with the same key is queued once."""
+
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'abc'}
+        self._upload(Image.new('RGB', (10, 10)), False, headers)
+        self._upload(Image.new('RGB', (10, 10)), False, headers)
+
+        self.assertEqual(Job.objects.filter(kind='recipe_image').count(), 1)
+
+    def test_upload_image_concurrent_retry(self):
+        """Test a retry queued concurrently keeps the first upload."""
+
+        headers = {'HTTP_IDEMPOTENCY_KEY': 'abc'}
+        self._upload(Image.new('RGB', (10, 10)), False, headers)
+        self.recipe.refresh_from_db()
+        pending = self.recipe.image_pending
+        # a retry that passed the key check before the first was queued
+        upload = default_storage.save(
+            f'{UPLOAD_DIR}/retry.jpg', ContentFile(b'retry'),
+        )
+
+        queue_stored_upload(
+            self.recipe, 'image', upload, 'recipe_image',
+            key=f'recipe_image:{self.recipe.id}:abc',
+        )
+
+        self.assertFalse(default_storage.exists(upload))
+        self.assertEqual(self.recipe.image_pending, pending)
+        jobs.run_pending()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+
+    def test_upload_image_variants(self):
+        """Test uploads are stored resized in WebP and JPEG."""
+
+        res = self._upload(Image.new('RGB', (2000, 1000)), run_jobs=False)
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        jobs.run_pending()
+        self.recipe.refresh_from_db()
+        variants = self.recipe.image_variants
+        self.assertEqual(set(variants), {'thumb', 'card', 'full'})
+        self.assertEqual(
+            (variants['full']['width'], variants['full']['height']),
+            (1600, 800),
+        )
+        self.assertEqual(self.recipe.image.name, variants['full']['jpeg'])
+        for fmt, pil_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            with Image.open(self.recipe.image.storage.path(
+                variants['thumb'][fmt]
+            )) as thumb:
+                self.assertEqual(thumb.format, pil_format)
+                self.assertEqual(thumb.size, (200, 100))
+
+    def test_upload_image_exif_rotated_and_stripped(self):
+        """Test EXIF orientation is applied and metadata removed."""
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'Camera maker'
+        self._upload(Image.new('RGB', (40, 20)), exif=exif)
+
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.path) as img:
+            self.assertEqual(img.size, (20, 40))
+            self.assertEqual(dict(img.getexif()), {})
+
+    def test_upload_image_replaces_variants(self):
+        """Test files of a replaced image are garbage-collected."""
+
+        self._upload(Image.new('RGB', (10, 10), 'red'))
+        self.recipe.refresh_from_db()
+        old_path = self.recipe.image.path
+
+        self._upload(Image.new('RGB', (10, 10), 'blue'))
+        collect_garbage(timedelta(0))
+
+        self.assertFalse(os.path.exists(old_path))
+        self.recipe.refresh_from_db()
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_same_image_stored_once(self):
+        """Test recipes with the same image share its files."""
+
+        other = create_recipe(user=self.user)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10), 'red').save(image_file, format='JPEG')
+            for recipe in (self.recipe, other):
+                image_file.seek(0)
+                self.client.post(
+                    image_upload_url(recipe.id), {'image': image_file},
+                    format='multipart',
+                )
+        jobs.run_pending()
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image_variants, self.recipe.image_variants)
+        # deleting one recipe keeps the files of the other
+        self.client.delete(detail_url(other.id))
+        collect_garbage(timedelta(0))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_list_recipes_thumbnail_only(self):
+        """Test lists return the thumbnail, details all variants."""
+
+        self._upload(Image.new('RGB', (800, 800)))
+        self.recipe.refresh_from_db()
+
+        res = self.client.get(RECIPES_URL)
+        recipe = res.data['results'][0]
+        self.assertNotIn('image', recipe)
+        self.assertIn(
+            self.recipe.image_variants['thumb']['jpeg'], recipe['thumbnail'],
+        )
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(
+            set(res.data['image_variants']), {'thumb', 'card', 'full'},
+        )
+        self.assertIn('200w', res.data['image_srcset']['webp'])
+
+    def test_upload_undecodable_image_fails(self):
+        """Test an image Pillow can't decode ends up failed."""
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.client.post(
+                image_upload_url(self.recipe.id), {'image': image_file},
+                format='multipart',
+            )
+        # corrupt the stored upload before the job runs
+        self.recipe.refresh_from_db()
+        with open(self.recipe.image.storage.path(
+            self.recipe.image_pending
+        ), 'wb') as upload:
+            upload.write(b'not an image')
+
+        jobs.run_pending()
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'failed')
+        self.assertEqual(self.recipe.image_pending, '')
+
     def test_upload_image_bad_request(self):
         """Test uploading invalid image."""
 
@@ -0,0 +1,200 @@
+"""
+Tests for the delta sync API.
+"""
+import json
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe title.',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(email='user@example.com', password='test123'):
+    """Create and return a new user."""
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+def sync(client, **params):
+    """Call the sync API and return the status code and decoded body."""
+    res = client.get(SYNC_URL, params)
+    if not res.streaming:
+        return res.status_code, res.data
+    return res.status_code, json.loads(b''.join(res.streaming_content))
+
+
+class PublicSyncAPITests(TestCase):
+    """Test unauthenticated sync requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to sync."""
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncAPITests(TestCase):
+    """Test authenticated sync requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync(self):
+        """Test a sync from 0 returns all of the user's objects."""
+        recipe = create_recipe(user=self.user, title='Soup')
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag)
+        create_recipe(user=create_user(email='other@example.com'))
+
+        status_code, data = sync(self.client)
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertFalse(data['has_more'])
+        changes = [(c['type'], c['id']) for c in data['changes']]
+        self.assertEqual(changes, [('recipe', recipe.id), ('tag', tag.id)])
+        self.assertEqual(data['changes'][0]['data']['title'], 'Soup')
+        self.assertEqual(data['next'], data['changes'][-1]['cursor'])
+
+    def test_sync_since_cursor(self):
+        """Test only objects changed after the cursor are returned."""
+        recipe = create_recipe(user=self.user, title='Soup')
+        create_recipe(user=self.user, title='Salad')
+        _, data = sync(self.client)
+
+        recipe.title = 'Stew'
+        recipe.save()
+        _, data = sync(self.client, since=data['next'])
+
+        self.assertEqual(len(data['changes']), 1)
+        self.assertEqual(data['changes'][0]['id'], recipe.id)
+        self.assertEqual(data['changes'][0]['data']['title'], 'Stew')
+
+    def test_sync_deleted_recipe_tombstone(self):
+        """Test deleting a recipe through the API records a tombstone."""
+        recipe = create_recipe(user=self.user)
+        _, data = sync(self.client)
+
+        self.client.delete(
+            reverse('recipe:recipe-detail', args=[recipe.id])
+        )
+        _, data = sync(self.client, since=data['next'])
+
+        self.assertEqual(data['changes'], [{
+            'cursor': data['next'],
+            'type': 'recipe',
+            'id': recipe.id,
+            'deleted': True,
+            'data': None,
+        }])
+
+    def test_sync_tag_delete_updates_recipes(self):
+        """Test deleting a tag returns a tombstone and its recipes."""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag)
+        _, data = sync(self.client)
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        _, data = sync(self.client, since=data['next'])
+
+        changes = {(c['type'], c['id']): c for c in data['changes']}
+        self.assertTrue(changes[('tag', tag.id)]['deleted'])
+        self.assertEqual(changes[('recipe', recipe.id)]['data']['tags'], [])
+
+    def test_sync_returns_latest_change_once(self):
+        """Test an object changed several times is returned once."""
+        recipe = create_recipe(user=self.user)
+        for i in range(3):
+            recipe.title = f'Title {i}'
+            recipe.save()
+
+        _, data = sync(self.client)
+
+        self.assertEqual(len(data['changes']), 1)
+        self.assertEqual(data['changes'][0]['data']['title'], 'Title 2')
+
+    def test_sync_bulk_created_objects(self):
+        """Test recipes and tags created in bulk are synced."""
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 5, 'price': '1.00',
+             'ingredients': [{'name': 'Salt'}]}
+            for i in range(3)
+        ]
+        self.client.post(
+            reverse('recipe:recipe-bulk'), payload, format='json',
+        )
+
+        _, data = sync(self.client)
+
+        types = [c['type'] for c in data['changes']]
+        self.assertEqual(types.count('recipe'), 3)
+        self.assertEqual(types.count('ingredient'), 1)
+        salt = Ingredient.objects.get(user=self.user, name='Salt')
+        self.assertIn(
+            {'id': salt.id, 'name': 'Salt'},
+            [c['data'] for c in data['changes']],
+        )
+
+    @override_settings(SYNC_MAX_PAGE_SIZE=2)
+    def test_sync_paginated(self):
+        """Test syncs are returned in pages following next."""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        synced = []
+        since = 0
+        for _ in range(3):
+            _, data = sync(self.client, since=since, limit=10)
+            self.assertLessEqual(len(data['changes']), 2)
+            synced.extend(c['id'] for c in data['changes'])
+            since = data['next']
+            if not data['has_more']:
+                break
+
+        self.assertFalse(data['has_more'])
+        self.assertEqual(synced, [recipe.id for recipe in recipes])
+
+    @skipUnless(connection.vendor == 'postgresql', 'row locks need Postgres')
+    def test_changes_recorded_under_user_lock(self):
+        """Test recording a change locks the user's row until commit."""
+        with CaptureQueriesContext(connection) as queries:
+            Tag.objects.create(user=self.user, name='Dinner')
+
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertIn('FOR NO KEY UPDATE', sql)
+        self.assertLess(
+            sql.index('FOR NO KEY UPDATE'),
+            sql.index('INSERT INTO "core_change"'),
+        )
+
+    def test_sync_invalid_cursor(self):
+        """Test an invalid cursor returns an error."""
+        status_code, _ = sync(self.client, since='abc')
+
+        self.assertEqual(status_code, status.HTTP_400_BAD_REQUEST)
@@ -3,6 +3,7 @@ Tests for tags APIs.
 """
 from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 
@@ -19,6 +20,7 @@ from recipe.serializers import TagSerializer
 
 # tags api that can be used in tests
 TAGS_URL = reverse('recipe:tag-list')
+SUGGEST_URL = reverse('recipe:tag-suggest')
 
 
 def create_user(email='user@example.com', password='testpass123'):
@@ -49,6 +51,12 @@ class PublicTagsAPITests(TestCase):
     #     # check that status code is HTTP 401
     #     self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def test_suggest_auth_required(self):
+        """Test auth is required for tag suggestions."""
+        res = self.client.get(SUGGEST_URL, {'prefix': 'din'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
 
 class PrivateTagsAPITests(TestCase):
     """Test authenticated API requests."""
@@ -56,6 +64,8 @@ class PrivateTagsAPITests(TestCase):
     # creates client and user
     # then authenticates client with that user
     def setUp(self):
+        # list caches are keyed by user id, which repeat across tests
+        cache.clear()
         self.client = APIClient()
         self.user = create_user()
         self.client.force_authenticate(self.user)
@@ -83,7 +93,16 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # check that data dict that was returned in the response
         # is equal to the data dict of the object passed through serializer
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_retrieve_tags_sparse_fields(self):
+        """Test ?fields= picks the tag fields returned."""
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'name': 'Vegan'}])
 
     def test_tags_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -101,11 +120,11 @@ class PrivateTagsAPITests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         # check if only 1 tag is returned in response
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
         # for the 1st resukt of data, the name should be
         # same as name for tag auth user
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
 
     def test_update_tag_name(self):
         """Test update tag name."""
@@ -128,6 +147,17 @@ class PrivateTagsAPITests(TestCase):
         self.assertEqual(tag.name, payload['name'])
         self.assertEqual(tag.user, self.user)
 
+    def test_update_tag_name_taken(self):
+        """Test renaming a tag to another of the user's tag names fails."""
+        Tag.objects.create(user=self.user, name='Dinner')
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Breakfast')
+
     def test_delete_tag(self):
         """Test deleting a tag successful."""
         tag = Tag.objects.create(user=self.user, name='Lunch')
@@ -161,8 +191,8 @@ class PrivateTagsAPITests(TestCase):
         s1 = TagSerializer(t1)
         s2 = TagSerializer(t2)
 
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filter_tags_unique(self):
         """Test filtered tags returns a unique list."""
@@ -189,4 +219,24 @@ class PrivateTagsAPITests(TestCase):
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
         # check that Raw returns only once
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_suggest_tags(self):
+        """Test tag suggestions match the prefix, most used first."""
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        dip = Tag.objects.create(user=self.user, name='Dip')
+        Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Hummus',
+            time_minutes=10,
+            price=Decimal('3.00'),
+        )
+        recipe.tags.add(dip)
+
+        res = self.client.get(SUGGEST_URL, {'prefix': 'di'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['id'] for tag in res.data], [dip.id, dinner.id],
+        )
@@ -0,0 +1,127 @@
+"""
+Tests for rendering the recipe API lists from .values() rows.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Ingredient, Recipe, Tag
+from core.serializers import ValuesSerializer
+from recipe.serializers import (
+    IngredientSerializer,
+    RecipeSerializer,
+    RecipeValuesSerializer,
+    TagSerializer,
+)
+from user.serializers import UserSerializer
+
+
+class ValuesSerializerTests(TestCase):
+    """Test ValuesSerializers render what the ModelSerializers render."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password',
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Kale', 'Salt', 'Sugar')
+        ]
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title='Kale salad',
+            time_minutes=10,
+            price=Decimal('5.5'),
+            link='https://example.com/salad.pdf',
+            description='Toss it.',
+            image_variants={
+                'thumb': {
+                    'width': 200, 'height': 100,
+                    'webp': 'blobs/ab/thumb.webp',
+                    'jpeg': 'blobs/ab/thumb.jpg',
+                },
+                'full': {
+                    'width': 1200, 'height': 600,
+                    'webp': 'blobs/cd/full.webp',
+                    'jpeg': 'blobs/cd/full.jpg',
+                },
+            },
+        )
+        recipe.tags.set(tags)
+        recipe.ingredients.set(ingredients[:2])
+        # no image, tags, ingredients or link
+        Recipe.objects.create(
+            user=self.user,
+            title='Water',
+            time_minutes=1,
+            price=Decimal('0.00'),
+        )
+
+    def _request(self, params=None):
+        request = Request(APIRequestFactory().get('/', params))
+        request.user = self.user
+        return request
+
+    def assertSameOutput(self, serializer_class, values_class, queryset,
+                         params=None):
+        """Assert both serializers render queryset identically."""
+        context = {'request': self._request(params)}
+        values_serializer = values_class(serializer_class(context=context))
+
+        actual = values_serializer.to_representation(
+            values_serializer.values(queryset),
+        )
+
+        expected = serializer_class(queryset, many=True, context=context).data
+        self.assertEqual(len(actual), len(expected))
+        for item, expected_item in zip(actual, expected):
+            # same fields, in the same order
+            self.assertEqual(list(item.items()), list(expected_item.items()))
+
+    def test_recipes(self):
+        """Test recipes with and without image, tags and ingredients."""
+        self.assertSameOutput(
+            RecipeSerializer, RecipeValuesSerializer,
+            Recipe.objects.prefetch_related(
+                'tags', 'ingredients',
+            ).order_by('-id'),
+        )
+
+    def test_recipes_sparse_fields(self):
+        """Test ?fields= and ?expand= pick the same fields."""
+        self.assertSameOutput(
+            RecipeSerializer, RecipeValuesSerializer,
+            Recipe.objects.prefetch_related('tags').order_by('-id'),
+            {
+                'fields': 'title,price,tags,image_variants,image_srcset',
+                'expand': 'image_variants,image_srcset',
+            },
+        )
+
+    def test_tags(self):
+        """Test tags."""
+        self.assertSameOutput(
+            TagSerializer, ValuesSerializer, Tag.objects.order_by('-id'),
+        )
+
+    def test_ingredients(self):
+        """Test ingredients."""
+        self.assertSameOutput(
+            IngredientSerializer, ValuesSerializer,
+            Ingredient.objects.order_by('-id'),
+        )
+
+    def test_unsupported_field(self):
+        """Test fields that can't be read from rows are refused."""
+        # profile: nested serializer of a one-to-one relation
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesSerializer(UserSerializer())
@@ -23,4 +23,5 @@ app_name = 'recipe'  # used for reverse lookup of URLs
 
 urlpatterns = [
     path('', include(router.urls)),  # include urls generated by router
+    path('sync/', views.SyncView.as_view(), name='sync'),
 ]
@@ -7,22 +7,67 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes,
 )
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.translation import gettext as _
 from rest_framework import (
     viewsets,
     mixins,
     status,
 )
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import IntegerField
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.views import APIView
+from rest_framework.permissions import (
+    IsAuthenticated,
+    IsAuthenticatedOrReadOnly,
+)
 
+from core.authentication import StatelessJWTAuthentication
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    Change,
 )
+from core.conditional import ConditionalGetMixin
+from core.serializers import ValuesSerializer, sparse_serializer
 from recipe import serializers
+from recipe.cache import CachedListMixin, list_cache_key
+from recipe.pagination import IdCursorPagination
+from recipe.search import RecipeSearchFilter, update_search_vector
+from recipe.sync import stream_changes
+
+
+class ValuesListMixin:
+    """Render list responses with values_serializer_class.
+
+    The page is loaded with .values() and rendered by a
+    core.serializers.ValuesSerializer built from the list serializer:
+    same output, without model instances or per-field serializer calls.
+    """
+    values_serializer_class = ValuesSerializer
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.values_serializer_class(
+            self.get_serializer(),
+        )
+        queryset = values_serializer.values(
+            self.filter_queryset(self.get_queryset()),
+        )
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                values_serializer.to_representation(page),
+            )
+        return Response(values_serializer.to_representation(queryset))
 
 
 @extend_schema_view(
@@ -38,42 +83,104 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR, enum=['any', 'all'],
+                description='Return recipes having any (default) or all '
+                            'of the given tags/ingredients.',
+            ),
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                description='Search title, description, tags and '
+                            'ingredients; results are ordered by relevance.',
+            ),
+            OpenApiParameter(
+                'fields',
+                OpenApiTypes.STR,
+                description='Comma separated list of the fields to return '
+                            '(default: all).',
+            ),
+            OpenApiParameter(
+                'expand',
+                OpenApiTypes.STR,
+                description='Comma separated list of detail fields to add: '
+                            'image_variants, image_srcset.',
+            ),
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedListMixin,
+                    ConditionalGetMixin,
+                    ValuesListMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe APIs."""
     serializer_class = serializers.RecipeDetailSerializer
+    values_serializer_class = serializers.RecipeValuesSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = (JWTAuthentication, )
+    authentication_classes = (StatelessJWTAuthentication, )
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = IdCursorPagination
+    filter_backends = [RecipeSearchFilter]
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
         return [int(str_id) for str_id in qs.split(',')]
 
+    def _filter_related(self, queryset, field, ids, match_all):
+        """Keep recipes linked to any (or all) of the ids.
+
+        Filters with 'id IN (SELECT recipe_id FROM <m2m table> ...)' so
+        the recipe rows are never joined and duplicated, which means no
+        DISTINCT over the full (wide) recipe rows is needed.
+        """
+        # m2m table column pointing at the tag/ingredient ('tag_id')
+        related_id = Recipe._meta.get_field(field).m2m_reverse_name()
+        links = getattr(Recipe, field).through.objects.filter(
+            **{f'{related_id}__in': ids}
+        )
+        if match_all:
+            # recipes having a link row for every requested id
+            links = links.values('recipe_id').annotate(
+                matched=Count(related_id),
+            ).filter(matched=len(set(ids)))
+
+        return queryset.filter(id__in=links.values('recipe_id'))
+
     def get_queryset(self):
         """Retrieve recipes for authenticated user."""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        match_all = self.request.query_params.get('match') == 'all'
         queryset = self.queryset
         if tags:
             tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            queryset = self._filter_related(
+                queryset, 'tags', tag_ids, match_all,
+            )
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-
-        # return queryset.filter(
-        #     user=self.request.user
-        # ).order_by('-id').distinct()
+            queryset = self._filter_related(
+                queryset, 'ingredients', ingredient_ids, match_all,
+            )
 
         if self.request.user.is_authenticated:
             # Filter by user only when authenticated
             queryset = queryset.filter(user=self.request.user)
 
-        # distinct: to avoid duplicates
-        return queryset.order_by('-id').distinct()
+        # search_vector is only read by the database (?q= search)
+        queryset = queryset.defer('search_vector')
+        serializer = sparse_serializer(self)
+        if serializer is not None:
+            # ?fields=: load only the columns/relations rendered
+            # (updated_at: conditional GET validators)
+            queryset = serializer.project(queryset, always=['updated_at'])
+        else:
+            # prefetch nested tags/ingredients in one query each per page
+            # instead of two extra queries per serialized recipe
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+
+        return queryset.order_by('-id')
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
@@ -88,15 +195,106 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe."""
         serializer.save(user=self.request.user)
 
+    def _bulk_ids(self, items):
+        """Return the ids of the bulk items and their per-item errors.
+
+        Ids may be sent as numbers or numeric strings. An id given
+        twice would replace the same recipe twice, so it's refused.
+        """
+        id_field = IntegerField()
+        ids, errors, seen = [], [], set()
+        for item in items:
+            pk = item.get('id') if isinstance(item, dict) else None
+            error = {}
+            if pk is not None:
+                try:
+                    pk = id_field.run_validation(pk)
+                except ValidationError as exc:
+                    error['id'], pk = exc.detail, None
+                else:
+                    if pk in seen:
+                        error['id'], pk = [_('Duplicate id.')], None
+                    else:
+                        seen.add(pk)
+            ids.append(pk)
+            errors.append(error)
+        return ids, errors
+
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """Create or update many recipes in one transaction.
+
+        Items with an 'id' replace that recipe, the others are created.
+        Responds with the saved recipes, or with a list of errors
+        aligned with the submitted items.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            msg = _('Expected a list of recipes.')
+            return Response(
+                {'detail': msg}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        max_size = settings.RECIPE_BULK_MAX_BATCH_SIZE
+        if len(items) > max_size:
+            msg = _('Too many recipes, the maximum batch size is %d.')
+            return Response(
+                {'detail': msg % max_size},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ids, errors = self._bulk_ids(items)
+        owned = Recipe.objects.filter(
+            user=request.user,
+        ).defer('search_vector').in_bulk(
+            [pk for pk in ids if pk is not None]
+        )
+        instances = [owned.get(pk) if pk is not None else None for pk in ids]
+        for pk, instance, error in zip(ids, instances, errors):
+            if pk is not None and instance is None:
+                error['id'] = [_('Not found.')]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(instances, data=items, many=True)
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        with transaction.atomic():
+            recipes = serializer.save(user=request.user)
+
+        saved = Recipe.objects.prefetch_related(
+            'tags', 'ingredients',
+        ).defer('search_vector').in_bulk([recipe.id for recipe in recipes])
+        serializer = self.get_serializer(
+            [saved[recipe.id] for recipe in recipes], many=True,
+        )
+        created = any(instance is None for instance in instances)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """Upload an image to recipe."""
+        """Upload an image to recipe.
+
+        The image is processed in the background: responds 202 with
+        image_status 'pending', the recipe's image/image_variants are
+        updated (and image_status set to 'ready') once it's done.
+        Retries sending the same Idempotency-Key header are queued once.
+        """
         recipe = self.get_object()
-        serializer = self.get_serializer(recipe, data=request.data)
+        key = request.headers.get('Idempotency-Key')
+        serializer = self.get_serializer(recipe, data=request.data, context={
+            **self.get_serializer_context(),
+            'idempotency_key': key and f'recipe_image:{recipe.id}:{key}',
+        })
 
         if serializer.is_valid():
             serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -112,13 +310,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         ]
     )
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
+class BaseRecipeAttrViewSet(CachedListMixin,
+                            ConditionalGetMixin,
+                            ValuesListMixin,
+                            mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     """Base viewset for recipe attributes."""
-    authentication_classes = (JWTAuthentication, )
+    authentication_classes = (StatelessJWTAuthentication, )
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         """Filter queryset to authenticated user."""
@@ -137,8 +339,66 @@ class BaseRecipeAttrViewSet(mixins.DestroyModelMixin,
             # Filter by user only when authenticated
             queryset = queryset.filter(user=self.request.user)
 
+        serializer = sparse_serializer(self)
+        if serializer is not None:
+            queryset = serializer.project(queryset, always=['updated_at'])
+
         return queryset.order_by('-id').distinct()
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'prefix',
+                OpenApiTypes.STR,
+                description='Beginning of the name (case insensitive).',
+            ),
+        ],
+        responses=serializers.SuggestionSerializer(many=True),
+    )
+    @action(methods=['GET'], detail=False,
+            permission_classes=[IsAuthenticated])
+    def suggest(self, request):
+        """Names starting with prefix, most used in recipes first."""
+        key = list_cache_key(request)
+        data = cache.get(key)
+        if data is None:
+            prefix = request.query_params.get('prefix', '').strip()
+            queryset = self.queryset.filter(user=request.user)
+            if prefix:
+                queryset = queryset.filter(name__istartswith=prefix)
+            queryset = queryset.annotate(
+                usage=Count('recipe'),
+            ).order_by('-usage', 'name')[:settings.SUGGEST_LIMIT]
+            data = serializers.SuggestionSerializer(queryset, many=True).data
+            cache.set(key, data, settings.RECIPE_LIST_CACHE_TIMEOUT)
+
+        response = Response(data)
+        # called on every keystroke, let the client reuse answers briefly
+        response['Cache-Control'] = \
+            f'private, max-age={settings.SUGGEST_MAX_AGE}'
+        return response
+
+    def _affected_recipes(self, instance):
+        return list(instance.recipe_set.only('id', 'user_id'))
+
+    def _touch_recipes(self, recipes):
+        """Mark recipes showing a changed tag/ingredient as changed."""
+        if recipes:
+            update_search_vector(
+                Recipe.objects.filter(id__in=[r.id for r in recipes]),
+                updated_at=timezone.now(),
+            )
+            Change.objects.record(recipes)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self._touch_recipes(self._affected_recipes(serializer.instance))
+
+    def perform_destroy(self, instance):
+        recipes = self._affected_recipes(instance)
+        super().perform_destroy(instance)
+        self._touch_recipes(recipes)
+
 
 class TagViewSet(BaseRecipeAttrViewSet):
     """Manage tags in the database."""
@@ -151,6 +411,58 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
 
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            'since',
+            OpenApiTypes.INT,
+            description='Cursor returned as "next" by the previous sync, '
+                        '0 (default) for a full sync.',
+        ),
+        OpenApiParameter(
+            'limit',
+            OpenApiTypes.INT,
+            description='Maximum number of changes to return.',
+        ),
+    ],
+    responses={200: OpenApiTypes.OBJECT},
+)
+class SyncView(APIView):
+    """Recipes, tags and ingredients changed or deleted since a cursor.
+
+    Every object appears once, with its current data, or as a tombstone
+    (deleted: true, data: null). Clients repeat the request with
+    since=<next> while has_more is true.
+    """
+    authentication_classes = (StatelessJWTAuthentication, )
+    permission_classes = [IsAuthenticated]
+
+    def _int_param(self, name, default, minimum):
+        value = self.request.query_params.get(name, default)
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            value = None
+        if value is None or value < minimum:
+            raise ValidationError(
+                {name: [_('Must be an integer >= %d.') % minimum]}
+            )
+        return value
+
+    def get(self, request):
+        since = self._int_param('since', 0, 0)
+        limit = min(
+            self._int_param('limit', settings.SYNC_PAGE_SIZE, 1),
+            settings.SYNC_MAX_PAGE_SIZE,
+        )
+        response = StreamingHttpResponse(
+            stream_changes(request, since, limit),
+            content_type='application/json',
+        )
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
 ###########################################
 
 # """
@@ -0,0 +1,11 @@
+"""
+Background jobs of the user app.
+"""
+from core import jobs
+from core.images import process_upload, upload_failed
+
+
+@jobs.register('profile_picture', on_failure=upload_failed)
+def process_profile_picture(payload):
+    """Create the variants of an uploaded profile picture."""
+    process_upload(payload)
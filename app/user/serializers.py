@@ -1,7 +1,10 @@
 """
 Serializers for the user API View.
 """
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
 from rest_framework_simplejwt.tokens import RefreshToken
 
 # get_user_model(): used to retrieve the User model that
@@ -12,6 +15,7 @@ from django.contrib.auth import (
     authenticate,  # alows to auth with auth system
     )
 
+from django.utils import timezone
 from django.utils.translation import gettext as _
 
 # serializers modules includes tools for defining serializers (base classes)
@@ -23,15 +27,37 @@ from django.utils.translation import gettext as _
 # base classes: serializers.Serializer,
 # serializers.ModelSerializer (validates and save to a model in db)
 from rest_framework import serializers
+from core.hashers import hashing_slot
+from core.images import queue_upload, variant_urls
+from core.serializers import MediaImageMixin, SparseFieldsMixin
+from core.tokens import CachedRefreshToken
 from core.models import UserProfile
 
 # NEW
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SparseFieldsMixin,
+                            MediaImageMixin,
+                            serializers.ModelSerializer):
     """Serializer for the user profile object."""
 
+    picture_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = UserProfile
-        fields =  ('picture', 'bio', 'dob', 'pronouns', 'gender')
+        fields =  ('picture', 'picture_status', 'picture_variants', 'bio',
+                   'dob', 'pronouns', 'gender')
+        read_only_fields = ('picture_status',)
+
+    def get_picture_variants(self, profile):
+        """{variant: {'width', 'height', 'webp': url, 'jpeg': url}}"""
+        return variant_urls(
+            profile.picture_variants, self.context.get('request'),
+        )
+
+    def _queue_picture(self, profile, picture):
+        """Process an uploaded picture in the background."""
+        self.picture_job = queue_upload(
+            profile, 'picture', picture, 'profile_picture',
+        )
 
     def create(self, validated_data):
         """Create and return a user with encrypted password."""
@@ -49,16 +75,22 @@ class UserProfileSerializer(serializers.ModelSerializer):
         #     pronouns = validated_data['pronouns'],
         #     gender = validated_data['gender'],
         # ).save()
+        picture = validated_data.pop('picture', None)
         profile = UserProfile.objects.create(user=user, **validated_data)
+        if picture is not None:
+            self._queue_picture(profile, picture)
 
         return profile
 
     def update(self, instance, validated_data):
 
+        picture = validated_data.pop('picture', None)
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
         instance.save()
+        if picture is not None:
+            self._queue_picture(instance, picture)
         return instance
 
 
@@ -70,7 +102,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
     #     return profile
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer for the user object."""
 
     profile = UserProfileSerializer(read_only=True, many=False)
@@ -125,9 +157,18 @@ class UserSerializer(serializers.ModelSerializer):
 
         # if password was specified by the user for the update
         if password:
-            user.set_password(password)
+            with hashing_slot():
+                user.set_password(password)
             user.save()
 
+        # the profile's updated_at also versions the user (ETag of /me/);
+        # set it on the profile cached on the user too, or the ETag
+        # computed from it after the update would be the old one
+        now = timezone.now()
+        UserProfile.objects.filter(user=user).update(updated_at=now)
+        if type(user).profile.is_cached(user):
+            user.profile.updated_at = now
+
         return user  # used by the view later
 
     def get_name(self, obj):
@@ -185,23 +226,13 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-# UserSerializerWithToken is an extention of UserSerializer
-# generates a new refresh token when user registers, updates account info
-class UserSerializerWithToken(UserSerializer):
-    """Serializer for user token view."""
-
-    token = serializers.SerializerMethodField(read_only=True)
-
-    # pass all the meta values from Meta() in UserSerializer
-    class Meta(UserSerializer.Meta):
-        fields = UserSerializer.Meta.fields + ('token',)
-
-    def get_token(self, obj):  # user object
-        token = RefreshToken.for_user(obj)
-        return str(token.access_token)  # token needs to be a str
-
-
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Serializer for logging in: a token pair and the user's details.
+
+    Responds {'refresh', 'access', 'id', 'email', 'name', 'profile'}.
+    The user and profile are read by a single query (see
+    UserManager.get_by_natural_key), one refresh token is issued.
+    """
 
     # Override the default validate method
     # https://github.com/jazzband/djangorestframework-simplejwt/
@@ -210,15 +241,15 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         """Serialize more info about the user."""
 
         data = super().validate(attrs)
+        data.update(UserSerializer(self.user, context=self.context).data)
 
-        serializer = UserSerializerWithToken(self.user).data
+        return data
 
-        for k, v in serializer.items():
-            # ex. data['username'] = self.username
-            # ex. data['email'] = self.user.email
-            data[k] = v
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    """Serializer for refreshing tokens, with cached blacklist checks."""
+
+    token_class = CachedRefreshToken
 
-        return data
 
 # NEW
 class UserProfileImageSerializer(serializers.ModelSerializer):
@@ -4,12 +4,19 @@ Tests for the user API.
 
 # docker-compose run --rm app sh -c "python manage.py test"
 
+import tempfile
+
+from PIL import Image
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken
+from core import jobs
+from core.images import delete_variants
 from core.models import UserProfile
 
 # Add api url that we'll be testing
@@ -19,6 +26,8 @@ CREATE_USER_URL = reverse('user:create')
 
 # url endpoint for creating tokens in our user API
 TOKEN_URL = reverse('user:token_obtain_pair')
+# token pair alone, without the user
+TOKEN_PAIR_URL = reverse('user:token')
 
 # url endpoint for manage user API
 ME_URL = reverse('user:me')
@@ -138,6 +147,50 @@ class PublicUserApiTests(TestCase):
         # check that response status code is HTTP 200 OK
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_pair(self):
+        """Test the token API issues a token pair only."""
+        create_user(email='test@example.com', password='testpass123')
+        payload = {'email': 'test@example.com', 'password': 'testpass123'}
+
+        res = self.client.post(TOKEN_PAIR_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data), {'refresh', 'access'})
+
+    def test_login_payload(self):
+        """Test logging in issues one token pair along with the user."""
+        user = create_user(
+            email='test@example.com',
+            password='test-user-password123',
+            name='Test Name',
+        )
+        payload = {
+            'email': 'test@example.com',
+            'password': 'test-user-password123',
+        }
+
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(res.data),
+            {'refresh', 'access', 'id', 'email', 'name', 'profile'},
+        )
+        self.assertEqual(res.data['id'], user.id)
+        self.assertEqual(
+            OutstandingToken.objects.filter(user=user).count(), 1,
+        )
+
+    def test_login_user_and_profile_one_query(self):
+        """Test the user is read along with their profile."""
+        create_user(email='test@example.com', password='pass123')
+
+        with self.assertNumQueries(1):
+            user = get_user_model().objects.get_by_natural_key(
+                'test@example.com',
+            )
+            user.profile
+
     def test_create_token_bad_credentials(self):
         """Test returns error if credentials invalid."""
 
@@ -215,6 +268,41 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(res.data['name'], self.user.name)
         self.assertEqual(res.data['email'], self.user.email)
 
+    def test_retrieve_profile_sparse_fields(self):
+        """Test ?fields= picks the user fields returned."""
+        res = self.client.get(ME_URL, {'fields': 'email,name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data, {'email': self.user.email, 'name': self.user.name},
+        )
+
+    def test_retrieve_user_and_profile_one_query(self):
+        """Test /me/ and /profile/ read the user and profile at once."""
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}',
+        )
+
+        for url in (ME_URL, PROFILE_URL):
+            # including the authentication
+            with self.assertNumQueries(1):
+                res = client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_profile_not_modified(self):
+        """Test /me/ answers 304 until the user is updated."""
+
+        etag = self.client.get(ME_URL)['ETag']
+
+        res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(ME_URL, {'name': 'New name'})
+        res = self.client.get(ME_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['name'], 'New name')
+
     def test_post_me_not_allowed(self):
         """Test POST is not allowed for the me endpoint."""
 
@@ -298,6 +386,28 @@ class PrivateUserApiTests(TestCase):
     #     # make sure that user didn't change
     #     self.assertEqual(recipe.user, self.user)
 
+    def test_upload_profile_picture(self):
+        """Test profile pictures are processed in the background."""
+
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (800, 400)).save(image_file, format='PNG')
+            image_file.seek(0)
+            res = self.client.patch(
+                PROFILE_URL, {'picture': image_file}, format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.data['picture_status'], 'pending')
+
+        jobs.run_pending()
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.addCleanup(delete_variants, profile.picture_variants)
+        self.assertEqual(profile.picture_status, 'ready')
+        self.assertEqual(profile.picture_variants['thumb']['width'], 200)
+        self.assertEqual(profile.picture.name,
+                         profile.picture_variants['full']['jpeg'])
+
     def test_full_update_user_profile(self):
         """Test updating full user profile for the authenticated user."""
 
@@ -3,10 +3,7 @@ URL mappings for the user API.
 """
 from django.urls import path
 from user import views
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
+from rest_framework_simplejwt.views import TokenRefreshView
 
 # used for reverse mapping defined in test_user_api.py:
 # CREATE_USER_URL = reverse('user:create')
@@ -27,8 +24,8 @@ urlpatterns = [
     # path('profile/', views.getUserProfile, name='profile'),
     # path('profiles-list/', views.getUsersList, name='profiles-list'),
     # path('register/', views.registerUser, name='register'),
-    path('token/', TokenObtainPairView.as_view(),
-         name='token_obtain_pair'),
+    path('token/', views.BoundedTokenObtainPairView.as_view(),
+         name='token'),
     path('token/refresh/', TokenRefreshView.as_view(),
          name='token_refresh'),
     path('login/', views.MyTokenObtainPairView.as_view(),
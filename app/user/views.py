@@ -16,6 +16,9 @@ from rest_framework import generics, permissions
 # UserSerializer: a serializer created in serializers.py
 from user.serializers import UserSerializer, UserProfileSerializer
 from core.models import User, UserProfile
+from core.authentication import ProfileJWTAuthentication
+from core.conditional import ConditionalGetMixin
+from core.hashers import hashing_slot
 
 from django.shortcuts import render
 from django.http import HttpResponseRedirect
@@ -26,10 +29,7 @@ from django.contrib.auth import (
     get_user_model, authenticate, login
 )
 # from django.contrib.auth.views import LoginView
-from user.serializers import UserSerializerWithToken
 # from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.views import TokenObtainPairView
 # from django.contrib.auth.hashers import make_password
 # from rest_framework import status
@@ -45,35 +45,41 @@ from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnl
 from rest_framework.decorators import action
 
 
-class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
-    def validate(self, attrs):
-        data = super().validate(attrs)
+class BoundedHashingMixin:
+    """Hash the posted password in one of the process' hashing slots."""
 
-        serializer = UserSerializerWithToken(self.user).data
-        for k, v in serializer.items():
-            data[k] = v
+    def post(self, request, *args, **kwargs):
+        with hashing_slot():
+            return super().post(request, *args, **kwargs)
 
-        return data
 
+class BoundedTokenObtainPairView(BoundedHashingMixin, TokenObtainPairView):
+    """Obtain a token pair."""
 
-class MyTokenObtainPairView(TokenObtainPairView):
+
+class MyTokenObtainPairView(BoundedHashingMixin, TokenObtainPairView):
     serializer_class = MyTokenObtainPairSerializer
 
 
 # HTTP POST
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(BoundedHashingMixin, generics.CreateAPIView):
     """Create a new user in the system."""
 
     serializer_class = UserSerializer
 
 # RetrieveUpdateAPIView: http get and http patch/put
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
 
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication, )
+    # the user and their profile are read by one query
+    authentication_classes = (ProfileJWTAuthentication, )
     permission_classes = [IsAuthenticated]
 
+    def get_object_validators(self, instance):
+        """Validate with the profile, touched on every user update."""
+        return super().get_object_validators(instance.profile)
+
     # override get_object (gets object for any http request made for api)
     def get_object(self):
         """Retrieve and return the authenticated user."""
@@ -85,24 +91,36 @@ class CreateUserProfileView(generics.CreateAPIView):
     serializer_class = UserProfileSerializer
 
 
-class ManageUserProfileView(generics.RetrieveUpdateAPIView):
+class ManageUserProfileView(ConditionalGetMixin,
+                            generics.RetrieveUpdateAPIView):
 
     serializer_class = UserProfileSerializer
 
-    authentication_classes = (JWTAuthentication,)
+    # the user and their profile are read by one query
+    authentication_classes = (ProfileJWTAuthentication,)
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        """Retrieve recipes for authenticated user."""
+        """Retrieve the profile of the authenticated user."""
 
-        queryset = UserProfile.objects.get(user=self.request.user)
-        return queryset
+        return UserProfile.objects.filter(user=self.request.user)
 
     def get_object(self):
-        """Retrieve and return the authenticated user."""
+        """Retrieve and return the authenticated user's profile."""
+
+        # loaded along with the user by the authentication
+        return self.request.user.profile
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.picture_queued = hasattr(serializer, 'picture_job')
 
-        # return self.request.user.profile
-        return UserProfile.objects.get(user=self.request.user)
+    def update(self, request, *args, **kwargs):
+        """Update the profile, 202 when a new picture is being processed."""
+        response = super().update(request, *args, **kwargs)
+        if getattr(self, 'picture_queued', False):
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
 
 
 
@@ -7,7 +7,7 @@ function Recipe({ recipe }) {
     return (
         <Card className="my-3 p-3 rounded">
             <Link to={`/recipe/${recipe.id}`}>
-                <Card.Img src={recipe.image} />
+                <Card.Img src={recipe.thumbnail} />
             </Link>
 
             <Card.Body>
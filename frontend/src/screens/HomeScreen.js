@@ -25,7 +25,7 @@ function HomeScreen({ history }) {
     useEffect(() => {
         async function fetchRecipes(){
             const { data } = await axios.get('/api/recipe/recipes/')
-            setRecipes(data)
+            setRecipes(data.results)
         }
         fetchRecipes()
         }, [])
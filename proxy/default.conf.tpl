@@ -1,8 +1,24 @@
 server {
     listen ${LISTEN_PORT};
 
-    location /static {
-        alias /vol/static;
+    # static files only, media goes through the app (below)
+    location /static/static {
+        alias /vol/static/static;
+    }
+
+    # media files, sent once the app allowed it (X-Accel-Redirect)
+    location /protected-media/ {
+        internal;
+        alias /vol/static/media/;
+    }
+
+    # chunked uploads are streamed to the app as they arrive instead
+    # of being buffered to a temporary file first
+    location /api/uploads/ {
+        uwsgi_pass              ${APP_HOST}:${APP_PORT};
+        include                 /etc/nginx/uwsgi_params;
+        uwsgi_request_buffering off;
+        client_max_body_size    10M;
     }
 
     location / {
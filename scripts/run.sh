@@ -6,4 +6,4 @@ python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
-uwsgi --socket :9000 --workers 4  --master --enable-threads --module app.wsgi
\ No newline at end of file
+uwsgi --socket :9000 --workers ${UWSGI_WORKERS:-4} --threads ${UWSGI_THREADS:-4} --master --enable-threads --module app.wsgi